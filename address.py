@@ -0,0 +1,197 @@
+import importlib.util
+import os
+import threading
+
+from enrichment import REFERENCE_DIR
+
+# Structured address parsing.
+#
+# "770 5th Ave, Suite 2, San Diego, CA 92101, USA" -> street "770 5th Ave,
+# Suite 2", city "San Diego", state "CA", postal code "92101". One compiled
+# pattern splits a whole chunk column into street and locality (the last two
+# comma-separated parts): pyarrow's split kernel when pyarrow is installed,
+# pandas' str.extract otherwise. A million bars share a few thousand "City, ST 12345"
+# localities, so every distinct locality is parsed once (a vectorized extract
+# over the new ones) and remembered across chunks. States, by code or name,
+# and ZIP codes are checked against the gazetteer in reference/, held in
+# dicts: state aliases -> code and ZIP3 prefix -> states.
+
+ADDRESS_COLUMN = "Full Address"
+COMPONENT_COLUMNS = {
+    "street": "address_street",
+    "city": "address_city",
+    "state": "address_state",
+    "postal_code": "address_postal_code",
+}
+STATES_FILE = "us_states.csv"
+ZIP3_FILE = "zip3_states.csv"
+LOCALITY_CACHE_SIZE = 100_000
+ISSUES_SHOWN = 10
+ISSUES_KEPT = 1000  # distinct problem addresses/localities remembered per status for the report
+USE_ARROW = importlib.util.find_spec("pyarrow") is not None
+
+PARSED = "parsed"
+MISSING = "missing"
+UNPARSED = "unparsed"
+UNKNOWN_STATE = "unknown_state"
+ZIP_MISMATCH = "zip_state_mismatch"
+STATUSES = (PARSED, MISSING, UNPARSED, UNKNOWN_STATE, ZIP_MISMATCH)
+
+_COUNTRY_SUFFIX = r"(?i)(?:\s*,\s*|\s+)(?:USA|U\.S\.A\.|US|United States(?: of America)?)\s*$"
+_SPLIT = r"^(?:(?P<street>.*?)\s*,\s*)?(?P<locality>[^,]+,[^,]+)$"
+_LOCALITY = (r"^\s*(?P<city>[^,]*[^\s,])\s*,\s*(?P<state>[A-Za-z][A-Za-z .]*?)\.?"
+             r"(?:\s+(?P<postal_code>\d{5})(?:-\d{4})?)?\s*$")
+_UNPARSED = (None, None, None, UNPARSED)
+
+
+def _state_key(text):
+    # "N.Y." -> "NY", "new  york" -> "NEW YORK"
+    return " ".join(text.replace(".", "").upper().split())
+
+
+def _split_pandas(addresses):
+    """`(text, street, locality)` object arrays; text is the cleaned address, None when blank."""
+    text = addresses.astype("string").str.strip().str.replace(_COUNTRY_SUFFIX, "", regex=True)
+    text = text.mask(text == "")
+    parts = text.str.extract(_SPLIT)
+
+    def objects(series):
+        return series.astype(object).where(series.notna(), None).to_numpy()
+
+    street = parts["street"]
+    return objects(text), objects(street.mask(street == "")), objects(parts["locality"])
+
+
+def _split_arrow(addresses):
+    """_split_pandas with pyarrow compute kernels: a reverse split on the last two commas instead of a regex."""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    text = pc.utf8_trim_whitespace(pa.array(addresses.astype(object), type=pa.string(), from_pandas=True))
+    text = pc.replace_substring_regex(text, _COUNTRY_SUFFIX, "")
+    text = pc.if_else(pc.equal(text, ""), pa.scalar(None, pa.string()), text)
+    # ",," in front guarantees three parts: [",," + street, city, "ST 12345"]
+    parts = pc.split_pattern(pc.binary_join_element_wise("", "", text, ","), ",", max_splits=2, reverse=True)
+    street = pc.utf8_trim_whitespace(pc.utf8_slice_codeunits(pc.list_element(parts, 0), 2))
+    street = pc.if_else(pc.equal(street, ""), pa.scalar(None, pa.string()), street)
+    locality = pc.utf8_trim_whitespace(
+        pc.binary_join_element_wise(pc.list_element(parts, 1), pc.list_element(parts, 2), ","))
+    return tuple(array.to_numpy(zero_copy_only=False) for array in (text, street, locality))
+
+
+def address_components(street, city, state, postal_code):
+    """The `address_components` bar field; None when nothing could be parsed."""
+    if street is None and city is None and state is None and postal_code is None:
+        return None
+    return {"street": street, "city": city, "state": state, "postal_code": postal_code}
+
+
+class AddressParser:
+    """Splits the address column of DataFrame chunks into street, city, state and postal code."""
+
+    def __init__(self, reference_dir=REFERENCE_DIR, cache_size=LOCALITY_CACHE_SIZE):
+        import pandas as pd
+
+        states = pd.read_csv(os.path.join(reference_dir, STATES_FILE), dtype="string")
+        self.states = {}
+        for code, name in zip(states["code"], states["name"]):
+            self.states[_state_key(code)] = code
+            self.states[_state_key(name)] = code
+        self.zip3 = {}
+        for start, end, state in pd.read_csv(os.path.join(reference_dir, ZIP3_FILE), dtype="string").itertuples(
+                index=False):
+            for prefix in range(int(start), int(end) + 1):
+                self.zip3.setdefault(f"{prefix:03d}", set()).add(state)
+
+        self.cache_size = cache_size
+        self._localities = {}
+        self.counts = dict.fromkeys(STATUSES, 0)
+        self.issues = {status: {} for status in (UNPARSED, UNKNOWN_STATE, ZIP_MISMATCH)}
+        self._lock = threading.Lock()
+
+    def field_spec(self, columns=()):
+        """BAR_FIELD_SPEC-style entry for `address_components` (when the address column is in `columns`)."""
+        if ADDRESS_COLUMN not in columns:
+            return []
+        return [{"field": "address_components", "source": list(COMPONENT_COLUMNS.values()),
+                 "derive": "address_components"}]
+
+    def _parse_localities(self, localities):
+        """(city, state, postal code, status) for each locality string, through one vectorized extract."""
+        import pandas as pd
+
+        results = []
+        parts = pd.Series(localities, dtype="string").str.extract(_LOCALITY)
+        for city, state, postal_code in parts.itertuples(index=False):
+            if pd.isna(city):
+                results.append(_UNPARSED)
+                continue
+            postal_code = None if pd.isna(postal_code) else postal_code
+            code = self.states.get(_state_key(state))
+            if code is None:
+                results.append((city, None, postal_code, UNKNOWN_STATE))
+            elif postal_code and code not in self.zip3.get(postal_code[:3], ()):
+                results.append((city, code, postal_code, ZIP_MISMATCH))
+            else:
+                results.append((city, code, postal_code, PARSED))
+        return results
+
+    def parse(self, chunk):
+        """Add the COMPONENT_COLUMNS to `chunk`; unparseable parts are missing values."""
+        import numpy as np
+        import pandas as pd
+
+        if ADDRESS_COLUMN not in chunk.columns:
+            return chunk
+        text, street, locality = (_split_arrow if USE_ARROW else _split_pandas)(chunk[ADDRESS_COLUMN])
+
+        codes, localities = pd.factorize(locality)
+        results = [self._localities.get(value) for value in localities]
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            parsed = self._parse_localities([localities[i] for i in misses])
+            for i, result in zip(misses, parsed):
+                results[i] = result
+                if len(self._localities) < self.cache_size:
+                    self._localities[localities[i]] = result
+        # Rows without a locality have code -1, which picks the trailing _UNPARSED
+        results.append(_UNPARSED)
+
+        status = np.array([result[3] for result in results], dtype=object)[codes]
+        status[pd.isna(text)] = MISSING
+        # Without a readable locality the split itself is a guess: no street either
+        columns = {COMPONENT_COLUMNS["street"]: np.where(status == UNPARSED, None, street)}
+        for position, name in enumerate(["city", "state", "postal_code"]):
+            columns[COMPONENT_COLUMNS[name]] = np.array([result[position] for result in results], dtype=object)[codes]
+        chunk = chunk.assign(**columns)
+
+        status_counts = pd.Series(status).value_counts()
+        # Whole addresses for the unparsed ones, the locality for state and ZIP problems
+        issues = {s: pd.Series(text if s == UNPARSED else locality)[status == s].value_counts()
+                  for s in status_counts.index if s in self.issues}
+        with self._lock:
+            for s, count in status_counts.items():
+                self.counts[s] += int(count)
+            for s, values in issues.items():
+                seen = self.issues[s]
+                for value, count in values.items():
+                    if value in seen or len(seen) < ISSUES_KEPT:
+                        seen[value] = seen.get(value, 0) + int(count)
+        return chunk
+
+    def report(self):
+        return {
+            **self.counts,
+            "issues": {status: dict(sorted(addresses.items(), key=lambda item: -item[1]))
+                       for status, addresses in self.issues.items()},
+        }
+
+    def format(self):
+        lines = [f"🏠 Addresses: {self.counts[PARSED]} parsed"]
+        for status in STATUSES[1:]:
+            if self.counts[status]:
+                lines.append(f"- {status}: {self.counts[status]}")
+                top = sorted(self.issues.get(status, {}).items(), key=lambda item: -item[1])[:ISSUES_SHOWN]
+                for address, count in top:
+                    lines.append(f"    {address!r}: {count}")
+        return "\n".join(lines)
@@ -0,0 +1,117 @@
+import contextlib
+import threading
+
+import requests
+
+# Posting side of the migration. Kept free of pandas/numpy so that retry and
+# health-check commands start quickly.
+
+POST_TIMEOUT = 10
+HEALTH_TIMEOUT = 5
+
+_thread_local = threading.local()
+_session_pool = None
+
+
+class SessionPool:
+    """Process-wide requests sessions; a session is borrowed for one request at a time.
+
+    Posting threads come and go with each pipeline, but the sessions (and the
+    keep-alive connections in them) stay, so a long-lived process such as a
+    watch worker reconnects only when the server closes a connection.
+    """
+
+    def __init__(self):
+        self._idle = []
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def session(self):
+        with self._lock:
+            session = self._idle.pop() if self._idle else None
+        if session is None:
+            session = requests.Session()
+        try:
+            yield session
+        finally:
+            with self._lock:
+                self._idle.append(session)
+
+
+def use_session_pool():
+    """Send every request of this process through one SessionPool instead of per-thread sessions."""
+    global _session_pool
+    if _session_pool is None:
+        _session_pool = SessionPool()
+
+
+def get_session():
+    # One pooled session per posting thread so connections are reused across bars
+    session = getattr(_thread_local, "session", None)
+    if session is None:
+        session = requests.Session()
+        _thread_local.session = session
+    return session
+
+
+def _send(method, url, **kwargs):
+    if _session_pool is None:
+        return get_session().request(method, url, **kwargs)
+    with _session_pool.session() as session:
+        return session.request(method, url, **kwargs)
+
+
+def check_api(api_url):
+    """Return True when the API base answers with anything but a server error."""
+    try:
+        response = _send("GET", api_url.rsplit('/', 1)[0], timeout=HEALTH_TIMEOUT)
+        if response.status_code < 500:  # Any response that's not a server error
+            print("✅ API appears to be accessible")
+            return True
+        print(f"⚠️ API returned status code {response.status_code}")
+    except requests.exceptions.RequestException:
+        print(f"⚠️ Could not connect to API at {api_url}")
+    return False
+
+
+FAILURE_REASON_KEY = "_failure_reason"
+
+
+def strip_internal_fields(bar_object):
+    """Drop bookkeeping fields (failure reasons) before a bar is sent."""
+    if FAILURE_REASON_KEY not in bar_object:
+        return bar_object
+    return {k: v for k, v in bar_object.items() if k != FAILURE_REASON_KEY}
+
+
+def post_bar_with_reason(bar_object, api_url, body=None):
+    """Post one bar and return `(ok, reason)`; reason is None on success.
+
+    `body` is a pre-encoded wire_encoding.EncodedBody sent instead of `json=bar_object`.
+    """
+    bar_object = strip_internal_fields(bar_object)
+    try:
+        print(f"Posting bar: {bar_object['name']}")
+        if body is None:
+            response = _send("POST", api_url, json=bar_object, timeout=POST_TIMEOUT)
+        else:
+            response = _send("POST", api_url, data=body.data, headers=body.headers(), timeout=POST_TIMEOUT)
+        if response.status_code == 201:
+            print(f"Success: {bar_object['name']} posted")
+            return True, None
+        else:
+            print(f"⚠️ API Error: {response.status_code} - {response.text}")
+            return False, f"http_{response.status_code}"
+    except requests.exceptions.ConnectionError:
+        print(f"⚠️ Connection error: Could not connect to API at {api_url}")
+        return False, "connection_error"
+    except requests.exceptions.Timeout:
+        print(f"⚠️ Request timed out: {bar_object['name']}")
+        return False, "timeout"
+    except Exception as e:
+        print(f"⚠️ Request failed: {str(e)}")
+        return False, "request_error"
+
+
+def with_failure_reason(bar_object, reason):
+    return {**strip_internal_fields(bar_object), FAILURE_REASON_KEY: reason}
@@ -0,0 +1,361 @@
+"""Micro-benchmarks for the parsing hot paths of every mainV1.x variant.
+
+Runs normalize_time, expand_days_range, convert_opening_hours_to_business_hours
+and transform_row (transform_to_object2_format in V1.2/V1.3) over the fixed
+corpus in corpus.json and reports ns/op and peak allocated bytes/op. For V1.6
+the compiled field-mapping transformer is measured next to transform_row, per
+row and per 100-row chunk (iterrows + transform_row vs row tuples), and the
+single-pass hours_parser (uncached scan and memoized parse) next to the
+V1.6 hours parser, plus the address parser over a chunk. Results
+are compared with baseline.json; a run fails when any benchmark is slower or
+allocates more than `--threshold` times its baseline.
+
+Timings are the best of REPEATS repeats with the garbage collector off (as
+timeit does), so a collection triggered by an earlier benchmark does not land
+in a chunk-level one. On shared machines whole runs still slow down by 1.5x
+and more, for seconds or minutes at a time, so the check is noise-aware:
+
+- `--update-baseline` runs the suite BASELINE_RUNS times and stores each
+  benchmark's median time (a lucky fastest run does not reproduce) and its
+  noise: its upper-quartile run over that median, at most MAX_NOISE. It
+  warns when the machine was busy while recording; record baselines on a
+  quiet machine.
+- mainV1.1-V1.5 are frozen, so when their benchmarks run slower than their
+  baseline, the machine is slower: limits are scaled by that slowdown, at
+  most MAX_SLOWDOWN. Slow spells hit some workloads harder than others, so
+  the slowdown is the upper quartile of their ratios. Runs filtered to
+  exclude them are not scaled.
+- A benchmark is suspect when it is slower than `--threshold` times its
+  baseline times its noise times the machine slowdown.
+- A suspect is measured again up to CONFIRM_RUNS times in a fresh process
+  and passes only if one of those runs is within its unscaled limit
+  (`--threshold` times baseline times noise): a slow spell or an unlucky
+  process passes, a real regression stays, and the limit never widens past
+  what the baseline allows.
+
+Every pass runs in a child process (`--raw`), since the same code can be
+consistently slower in one interpreter than in the next.
+
+    python benchmarks/bench_hot_paths.py                    # compare with baseline
+    python benchmarks/bench_hot_paths.py --update-baseline  # store new baseline
+    python benchmarks/bench_hot_paths.py --filter normalize_time
+
+Baselines are machine specific: refresh them on the machine that runs the check.
+"""
+import argparse
+import gc
+import importlib.util
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+CORPUS_PATH = os.path.join(BENCH_DIR, "corpus.json")
+BASELINE_PATH = os.path.join(BENCH_DIR, "baseline.json")
+VERSIONS = ["1.1", "1.2", "1.3", "1.4", "1.5", "1.6"]
+FROZEN_VERSIONS = VERSIONS[:-1]  # never edited again: their timings only move with the machine
+DEFAULT_THRESHOLD = 1.25
+MIN_REPEAT_SECONDS = 0.05
+REPEATS = 7
+CONFIRM_RUNS = 5
+MAX_NOISE = 1.2  # so a 2x regression is over the unscaled limit even for the noisiest benchmark
+MAX_SLOWDOWN = 1.5  # machine slowdown the limits may be scaled by, at most
+QUIET_SPREAD = 1.15  # passes slower than this over the fastest mean the machine was busy
+BASELINE_RUNS = 5
+CHUNK_ROWS = 100
+
+sys.path.insert(0, REPO_DIR)
+
+
+def load_version(version):
+    path = os.path.join(REPO_DIR, f"mainV{version}.py")
+    spec = importlib.util.spec_from_file_location(f"mainV{version.replace('.', '_')}", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def _blank_nulls(row):
+    # V1.2/V1.3 read rows with `where(notnull, "")`, so they never see None
+    return {k: ("" if v is None else v) for k, v in row.items()}
+
+
+def collect_benchmarks(corpus):
+    """Return `(name, fn, args_list)` for every hot path in every version."""
+    benchmarks = []
+    for version in VERSIONS:
+        module = load_version(version)
+        tag = f"[V{version}]"
+        benchmarks.append((f"normalize_time{tag}", module.normalize_time,
+                           [(t,) for t in corpus["times"]]))
+        benchmarks.append((f"expand_days_range{tag}", module.expand_days_range,
+                           [tuple(r) for r in corpus["day_ranges"]]))
+        benchmarks.append((f"convert_opening_hours_to_business_hours{tag}",
+                           module.convert_opening_hours_to_business_hours,
+                           [(h,) for h in corpus["hours"]]))
+        if hasattr(module, "transform_row"):
+            benchmarks.append((f"transform_row{tag}", module.transform_row,
+                               [(r,) for r in corpus["rows"]]))
+        elif hasattr(module, "transform_to_object2_format"):
+            benchmarks.append((f"transform_row{tag}", module.transform_to_object2_format,
+                               [(_blank_nulls(r),) for r in corpus["rows"]]))
+        if hasattr(module, "compile_bar_transform"):
+            benchmarks.extend(compiled_mapping_benchmarks(module, corpus))
+
+    from hours_parser import parse_business_hours, scan_intervals
+    # scan_intervals is the uncached parse; parse_business_hours memoizes per string
+    benchmarks.append(("scan_intervals[hours_parser]", scan_intervals, [(h,) for h in corpus["hours"]]))
+    benchmarks.append(("parse_business_hours[hours_parser]", parse_business_hours,
+                       [(h,) for h in corpus["hours"]]))
+    benchmarks.append(address_benchmark(corpus))
+    return benchmarks
+
+
+def address_benchmark(corpus):
+    """AddressParser.parse over a CHUNK_ROWS-row chunk; localities are memoized after the first call."""
+    import pandas as pd
+    from address import AddressParser
+
+    addresses = [r.get("Full Address") for r in corpus["rows"]]
+    chunk = pd.DataFrame({"Full Address": [addresses[i % len(addresses)] for i in range(CHUNK_ROWS)]},
+                         dtype="string")
+    return ("address_parse_chunk[address]", AddressParser().parse, [(chunk,)])
+
+
+def compiled_mapping_benchmarks(module, corpus):
+    """transform_row against the compiled BAR_FIELD_SPEC, per row and per DataFrame chunk."""
+    import pandas as pd
+    from field_mapping import null_free_rows
+
+    columns = list(corpus["rows"][0])
+    transform = module.compile_bar_transform(columns)
+    chunk = pd.DataFrame([corpus["rows"][i % len(corpus["rows"])] for i in range(CHUNK_ROWS)], columns=columns)
+
+    def iterrows_chunk(df):
+        return [module.transform_row(row.where(pd.notnull(row), None).to_dict()) for _, row in df.iterrows()]
+
+    def compiled_chunk(df):
+        return [transform(row) for row in null_free_rows(df)]
+
+    return [
+        ("compiled_transform[V1.6]", transform, [(tuple(r[c] for c in columns),) for r in corpus["rows"]]),
+        ("transform_chunk_iterrows[V1.6]", iterrows_chunk, [(chunk,)]),
+        ("transform_chunk_compiled[V1.6]", compiled_chunk, [(chunk,)]),
+    ]
+
+
+def _time_loops(fn, args_list, loops):
+    start = time.perf_counter_ns()
+    for _ in range(loops):
+        for args in args_list:
+            fn(*args)
+    return time.perf_counter_ns() - start
+
+
+def measure_time(fn, args_list):
+    """Best-of-REPEATS ns per call over the whole argument list, with the garbage collector off."""
+    gc_was_enabled = gc.isenabled()
+    gc.collect()
+    gc.disable()
+    try:
+        loops = 1
+        while True:
+            elapsed = _time_loops(fn, args_list, loops)
+            if elapsed >= MIN_REPEAT_SECONDS * 1e9:
+                break
+            loops *= 2
+        best = elapsed
+        for _ in range(REPEATS - 1):
+            best = min(best, _time_loops(fn, args_list, loops))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return best / (loops * len(args_list))
+
+
+def measure_allocations(fn, args_list):
+    """Average peak traced bytes allocated by a single call."""
+    tracemalloc.start()
+    total = 0
+    try:
+        for args in args_list:
+            tracemalloc.reset_peak()
+            current, _ = tracemalloc.get_traced_memory()
+            fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            total += peak - current
+    finally:
+        tracemalloc.stop()
+    return total / len(args_list)
+
+
+def select(benchmarks, name_filter=None, names=None):
+    return [(name, fn, args_list) for name, fn, args_list in benchmarks
+            if (not name_filter or name_filter in name) and (names is None or name in names)]
+
+
+def run(benchmarks):
+    results = {}
+    for name, fn, args_list in benchmarks:
+        results[name] = {
+            "ns_per_op": round(measure_time(fn, args_list), 1),
+            "alloc_bytes_per_op": round(measure_allocations(fn, args_list), 1),
+        }
+    return results
+
+
+def run_in_subprocess(name_filter=None, names=None):
+    """run() in a fresh interpreter: timings vary with the process (memory layout), not only with the moment."""
+    command = [sys.executable, os.path.abspath(__file__), "--raw"]
+    if name_filter:
+        command += ["--filter", name_filter]
+    for name in names or ():
+        command += ["--only", name]
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.splitlines()[-1])
+
+
+def time_limit(base, threshold, slowdown=1.0):
+    return base["ns_per_op"] * threshold * base.get("noise", 1.0) * min(slowdown, MAX_SLOWDOWN)
+
+
+def is_frozen(name):
+    return name.endswith(tuple(f"[V{version}]" for version in FROZEN_VERSIONS))
+
+
+def machine_slowdown(results, baseline):
+    """Upper quartile of the frozen benchmarks' time ratios to the baseline; never below 1."""
+    ratios = [result["ns_per_op"] / baseline[name]["ns_per_op"] for name, result in results.items()
+              if is_frozen(name) and name in baseline]
+    if len(ratios) < 2:
+        return 1.0
+    return max(1.0, statistics.quantiles(ratios, n=4)[2])
+
+
+def over_limit(result, base, threshold):
+    return result["ns_per_op"] > time_limit(base, threshold, result.get("slowdown", 1.0))
+
+
+def confirm(results, baseline, threshold):
+    """Measure benchmarks over their limit again in fresh processes.
+
+    A confirmation is not scaled by the machine slowdown: a suspect takes a
+    confirmation's time only when it is within its unscaled limit.
+    """
+    for _ in range(CONFIRM_RUNS):
+        suspects = [name for name, result in results.items()
+                    if name in baseline and over_limit(result, baseline[name], threshold)]
+        if not suspects:
+            return
+        confirmation = run_in_subprocess(names=set(suspects))
+        for name in suspects:
+            if confirmation[name]["ns_per_op"] <= time_limit(baseline[name], threshold):
+                results[name].update(ns_per_op=confirmation[name]["ns_per_op"], slowdown=1.0)
+
+
+def measure_baseline(name_filter=None, runs=BASELINE_RUNS):
+    """Median result of `runs` passes in separate processes, with `noise` = upper quartile / median time.
+
+    Each pass's times are first divided by that pass's machine slowdown, so
+    the noise is the benchmark's own and not the machine's, which the check
+    scales for separately.
+    """
+    passes = [run_in_subprocess(name_filter) for _ in range(runs)]
+    best = {name: {"ns_per_op": min(p[name]["ns_per_op"] for p in passes)} for name in passes[0]}
+    slowdowns = [machine_slowdown(p, best) for p in passes]
+    if max(slowdowns) > QUIET_SPREAD:
+        print(f"⚠️ Some passes ran {max(slowdowns):.2f}x slower than the fastest: the machine is busy and "
+              "this baseline may not reproduce; record it on a quiet machine")
+    results = {}
+    for name in passes[0]:
+        times = [p[name]["ns_per_op"] / slowdown for p, slowdown in zip(passes, slowdowns)]
+        median = statistics.median(times)
+        results[name] = {
+            "ns_per_op": round(median, 1),
+            "alloc_bytes_per_op": min(p[name]["alloc_bytes_per_op"] for p in passes),
+            "noise": round(min(MAX_NOISE, max(1.0, statistics.quantiles(times, n=4)[2] / median)), 2),
+        }
+    return results
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    print(f"{'benchmark':<58} {'ns/op':>10} {'B/op':>9} {'vs base':>8} {'limit':>6}")
+    for name, result in results.items():
+        base = baseline.get(name)
+        ratio = result["ns_per_op"] / base["ns_per_op"] if base else None
+        alloc_ratio = (result["alloc_bytes_per_op"] / base["alloc_bytes_per_op"]
+                       if base and base["alloc_bytes_per_op"] else None)
+        flag = ""
+        if base and over_limit(result, base, threshold):
+            flag = "  ❌ slower"
+            regressions.append(name)
+        elif alloc_ratio is not None and alloc_ratio > threshold:
+            flag = "  ❌ allocates more"
+            regressions.append(name)
+        shown = f"{ratio:.2f}x" if ratio is not None else "new"
+        limit = f"{time_limit(base, threshold, result.get('slowdown', 1.0)) / base['ns_per_op']:.2f}x" if base else ""
+        print(f"{name:<58} {result['ns_per_op']:>10.1f} {result['alloc_bytes_per_op']:>9.1f} "
+              f"{shown:>8} {limit:>6}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the hours/row parsing hot paths")
+    parser.add_argument("--update-baseline", action="store_true", help="store results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="fail when a result exceeds baseline by this factor")
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this text")
+    # Used by run_in_subprocess: measure the named benchmarks and print the results as JSON
+    parser.add_argument("--raw", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--only", action="append", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.raw:
+        with open(CORPUS_PATH, 'r', encoding='utf-8') as f:
+            corpus = json.load(f)
+        print(json.dumps(run(select(collect_benchmarks(corpus), args.filter, args.only))))
+        return 0
+
+    baseline = {}
+    if os.path.exists(BASELINE_PATH):
+        with open(BASELINE_PATH, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)["results"]
+
+    if args.update_baseline:
+        results = measure_baseline(args.filter)
+    else:
+        results = run_in_subprocess(args.filter)
+        slowdown = machine_slowdown(results, baseline)
+        if slowdown > 1.0:
+            print(f"ℹ️ The frozen V1.1-V1.5 benchmarks run {slowdown:.2f}x slower than at baseline; "
+                  f"limits are scaled by that, at most {MAX_SLOWDOWN}x")
+        for result in results.values():
+            result["slowdown"] = slowdown
+        confirm(results, baseline, args.threshold)
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump({"machine": f"{platform.python_implementation()} {platform.python_version()} "
+                                  f"{platform.machine()}", "results": baseline}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"✅ Baseline updated: {BASELINE_PATH}")
+        return 0
+
+    if regressions:
+        print(f"\n❌ {len(regressions)} benchmark(s) regressed beyond {args.threshold}x baseline (times noise)")
+        return 1
+    print(f"\n✅ No regressions beyond {args.threshold}x baseline")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
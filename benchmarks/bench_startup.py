@@ -0,0 +1,81 @@
+"""Startup budget for the lightweight mainV1.6.py commands.
+
+Each command is started in a fresh interpreter several times; the median wall
+time must stay within STARTUP_BUDGET_MS, and none of them may import the
+heavy dependencies (pandas, numpy, openpyxl) at module load.
+
+    python benchmarks/bench_startup.py
+    python benchmarks/bench_startup.py --budget-ms 250
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+MAIN_SCRIPT = os.path.join(REPO_DIR, "mainV1.6.py")
+STARTUP_BUDGET_MS = 400
+RUNS = 7
+HEAVY_MODULES = ("pandas", "numpy", "openpyxl")
+LIGHT_COMMANDS = [
+    ["health", "--help"],
+    ["retry", "--help"],
+    ["replay", "--help"],
+]
+
+# Loads mainV1.6.py the way `python mainV1.6.py` does, then reports heavy imports
+_IMPORT_CHECK = """
+import importlib.util, sys
+sys.path.insert(0, {repo!r})
+spec = importlib.util.spec_from_file_location("main_script", {script!r})
+spec.loader.exec_module(importlib.util.module_from_spec(spec))
+print(",".join(m for m in {heavy!r} if m in sys.modules))
+"""
+
+
+def time_interpreter(argv, runs=RUNS):
+    """Median wall time in ms of `python <argv>` started from scratch."""
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run([sys.executable] + argv, check=True,
+                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def heavy_imports_at_load():
+    code = _IMPORT_CHECK.format(repo=REPO_DIR, script=MAIN_SCRIPT, heavy=HEAVY_MODULES)
+    output = subprocess.run([sys.executable, "-c", code], check=True, capture_output=True, text=True)
+    return [m for m in output.stdout.strip().split(",") if m]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the startup budget of the lightweight commands")
+    parser.add_argument("--budget-ms", type=float, default=STARTUP_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=RUNS)
+    args = parser.parse_args()
+
+    failures = 0
+    baseline_ms = time_interpreter(["-c", "pass"], args.runs)
+    print(f"{'bare interpreter':<24} {baseline_ms:8.1f} ms")
+    for argv in LIGHT_COMMANDS:
+        elapsed = time_interpreter([MAIN_SCRIPT] + argv, args.runs)
+        ok = elapsed <= args.budget_ms
+        failures += not ok
+        print(f"{' '.join(argv):<24} {elapsed:8.1f} ms  {'✅' if ok else '❌'} (budget {args.budget_ms:.0f} ms)")
+
+    heavy = heavy_imports_at_load()
+    if heavy:
+        failures += 1
+        print(f"❌ Heavy modules imported at load: {', '.join(heavy)}")
+    else:
+        print(f"✅ No heavy modules imported at load ({', '.join(HEAVY_MODULES)})")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Check that `preview` builds the same bars a run builds from the same rows.
+
+Converts the workbook the way `run` does (convert_excel_to_csv: pandas,
+Canada filter, pinned schema, CSV) and transforms the head of that CSV
+through the run's read and transform stages. Then previews the same head of
+the workbook (openpyxl rows) with a sample as large as the scan, so every row
+is previewed, and checks that every previewed bar is one the run built. A
+difference means preview and run read a cell differently, as when the run
+turned the SIC code "0742" into 742.
+
+    python benchmarks/check_preview_parity.py
+    python benchmarks/check_preview_parity.py content-folder/target-excel-file-copy.xlsx --rows 5000
+"""
+import argparse
+import collections
+import contextlib
+import io
+import json
+import math
+import os
+import sys
+import tempfile
+
+from bench_hot_paths import load_version, REPO_DIR
+
+sys.path.insert(0, REPO_DIR)
+
+SHOWN = 5
+
+
+def canonical(bar_object):
+    return json.dumps(bar_object, sort_keys=True, ensure_ascii=False, default=str)
+
+
+def run_bars(main, workbook, work_dir, scan_rows):
+    """Bars of a run over the rows a preview scanning `scan_rows` rows reads."""
+    from validation import ValidationSummary, QuarantineWriter
+
+    csv_path = os.path.join(work_dir, "converted.csv")
+    main.convert_excel_to_csv(workbook, csv_path)
+    index = main.load_or_build_csv_index(csv_path, every=main.CHUNK_SIZE)
+    quarantine = QuarantineWriter(os.path.join(work_dir, "quarantine.ndjson"))
+    read, transform = main.make_transform_stages(csv_path, index, ValidationSummary(), quarantine,
+                                                 enricher=main.Enricher(), addresses=main.AddressParser())
+    # Excluded rows are gone from the CSV, so its first `scan_rows` rows cover the workbook's first ones
+    blocks = min(main.block_count(index), math.ceil(scan_rows / main.CHUNK_SIZE))
+    bars = []
+    try:
+        for block_no in range(blocks):
+            bars.extend(transform.fn(read.fn(block_no))[1])
+    finally:
+        quarantine.close()
+    return bars
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare preview bars with the bars a run builds")
+    parser.add_argument("workbook", nargs="?", help="workbook (.xlsx); default: the run's INPUT_EXCEL")
+    parser.add_argument("--rows", type=int, help="workbook rows compared (default: preview's SCAN_ROWS)")
+    args = parser.parse_args()
+
+    main_module = load_version("1.6")
+    workbook = args.workbook or main_module.INPUT_EXCEL
+    rows = args.rows or main_module.SCAN_ROWS
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.redirect_stdout(io.StringIO()):
+        expected = run_bars(main_module, workbook, work_dir, rows)
+        previewed = main_module.preview_workbook(workbook, os.path.join(work_dir, "preview.json"),
+                                                 size=rows, scan_rows=rows)
+
+    built = collections.Counter(canonical(bar_object) for bar_object in expected)
+    by_slug = collections.defaultdict(list)
+    for bar_object in expected:
+        by_slug[bar_object.get("slug")].append(bar_object)
+    mismatches = []
+    for bar_object in previewed:
+        key = canonical(bar_object)
+        if built[key]:
+            built[key] -= 1
+        else:
+            mismatches.append(bar_object)
+
+    if mismatches:
+        for bar_object in mismatches[:SHOWN]:
+            print(f"❌ {bar_object.get('slug')!r} is not a bar the run built")
+            for candidate in by_slug.get(bar_object.get("slug"), [])[:1]:
+                for field in sorted(set(bar_object) | set(candidate)):
+                    if bar_object.get(field) != candidate.get(field):
+                        print(f"   {field}: preview {bar_object.get(field)!r}, run {candidate.get(field)!r}")
+        print(f"\n❌ {len(mismatches)} of {len(previewed)} previewed bars differ from the run")
+        return 1
+    print(f"✅ {len(previewed)} previewed bars match the run's bars for the same rows")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
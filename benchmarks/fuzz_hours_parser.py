@@ -0,0 +1,127 @@
+"""Fuzz the single-pass hours parser against the V1.6 regex/strptime parser.
+
+Generates random opening-hours strings in the grammar V1.6 accepts (day or
+day-range segments with 12-hour times, noon and midnight, odd casing and
+spacing, plus invalid times that both parsers must skip) and checks that
+hours_parser.parse_business_hours returns exactly what V1.6's
+convert_opening_hours_to_business_hours returns. Each string is also parsed
+with a colon after the days ("Mon-Fri: 4pm-12am"), which V1.6 does not read,
+and must give the same result.
+
+    python benchmarks/fuzz_hours_parser.py
+    python benchmarks/fuzz_hours_parser.py --iterations 200000 --seed 7
+
+Consecutive segments never name the same days: that is a split shift for the
+new parser, where V1.6 kept only the last segment.
+
+Grammar V1.6 does not read at all (Closed, hours without days after named
+days) is checked against the fixed expectations in FIXED_CASES first.
+"""
+import argparse
+import json
+import random
+import sys
+
+from bench_hot_paths import load_version, REPO_DIR
+
+sys.path.insert(0, REPO_DIR)
+
+from hours_parser import parse_business_hours, scan_intervals  # noqa: E402
+
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+ITERATIONS = 50_000
+SHOWN = 5
+
+_OPEN = ("11:00", "22:00")
+# Hours string -> scan_intervals() result, Monday first
+FIXED_CASES = {
+    "Sun Closed, 11am-10pm": [[_OPEN]] * 6 + [[]],
+    "Sun: Closed, 11am-10pm": [[_OPEN]] * 6 + [[]],
+    "Sat-Sun Closed, 11am-10pm": [[_OPEN]] * 5 + [[], []],
+    "Mon 9am-5pm, Sun Closed, 11am-10pm": [[("09:00", "17:00")]] + [[_OPEN]] * 5 + [[]],
+    "11am-10pm, Sun Closed": [[_OPEN]] * 6 + [[]],
+    "Sun Open 24 hours, 11am-10pm": [[_OPEN]] * 6 + [[("00:00", "00:00")]],
+    "Closed, 11am-10pm": [[]] * 7,
+}
+
+
+def random_time(rng):
+    roll = rng.random()
+    if roll < 0.08:
+        return rng.choice(["noon", "Noon", "NOON", "midnight", "Midnight"])
+    if roll < 0.12:
+        # Invalid for both parsers: the whole segment is skipped
+        return rng.choice(["13pm", "0am", "12:60pm", "25:00am"])
+    hour = rng.randint(1, 12)
+    text = f"{hour:02d}" if rng.random() < 0.1 else str(hour)
+    if rng.random() < 0.4:
+        text += f":{rng.choice([0, 15, 30, 45, rng.randint(0, 59)]):02d}"
+    return text + rng.choice(["am", "pm", "AM", "PM", "Am", "pM"])
+
+
+def random_days(rng):
+    start = rng.randrange(7)
+    if rng.random() < 0.5:
+        return DAYS[start], (start,)
+    end = rng.randrange(7)
+    span = range(start, end + 1) if start <= end else list(range(start, 7)) + list(range(0, end + 1))
+    return f"{DAYS[start]}-{DAYS[end]}", tuple(span)
+
+
+def random_hours(rng):
+    """`(hours, same hours with a colon after the days)`; V1.6 only reads the first."""
+    segments = []
+    colon_segments = []
+    previous = None
+    for _ in range(rng.randint(1, 6)):
+        text, days = random_days(rng)
+        if days == previous:
+            continue
+        previous = days
+        spacing = rng.choice([" ", " ", "  ", "\t"])
+        interval = f"{random_time(rng)}-{random_time(rng)}"
+        segments.append(f"{text}{spacing}{interval}")
+        colon_segments.append(f"{text}{rng.choice([':', ' :'])}{spacing}{interval}")
+    joiner = rng.choice([", ", ",", ",  "])
+    return joiner.join(segments), joiner.join(colon_segments)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fuzz parse_business_hours against the V1.6 parser")
+    parser.add_argument("--iterations", type=int, default=ITERATIONS)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    mismatches = []
+    for hours, expected in FIXED_CASES.items():
+        actual = scan_intervals(hours)
+        if actual != expected:
+            mismatches.append((hours, expected, actual))
+    if mismatches:
+        for hours, expected, actual in mismatches:
+            print(f"❌ {hours!r}\n   expected: {expected}\n   new:      {actual}")
+        print(f"\n❌ {len(mismatches)} of {len(FIXED_CASES)} fixed cases differ")
+        return 1
+
+    legacy = load_version("1.6").convert_opening_hours_to_business_hours
+    rng = random.Random(args.seed)
+    for _ in range(args.iterations):
+        hours, colon_hours = random_hours(rng)
+        expected = legacy(hours)
+        for text in (hours, colon_hours):
+            actual = parse_business_hours(text)
+            if actual != expected:
+                mismatches.append((text, expected, actual))
+
+    if mismatches:
+        for hours, expected, actual in mismatches[:SHOWN]:
+            print(f"❌ {hours!r}\n   V1.6: {json.dumps(expected)}\n   new:  {json.dumps(actual)}")
+        print(f"\n❌ {len(mismatches)} of {2 * args.iterations} strings differ")
+        return 1
+    print(f"✅ {len(FIXED_CASES)} fixed cases and {2 * args.iterations} random strings parsed identically "
+          f"(seed {args.seed})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
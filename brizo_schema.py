@@ -0,0 +1,102 @@
+import numbers
+
+# Pinned column types for the Brizo snapshot.
+#
+# Every CSV chunk is parsed with the same dtypes instead of letting pandas
+# re-infer them per chunk, so a column never flips between int, float and
+# object. Code-like columns stay text (no more SIC codes as 5813.0),
+# coordinates are always float64 and low-cardinality fields are categorical.
+
+TEXT = "string"
+CATEGORY = "category"
+FLOAT = "float64"
+
+BRIZO_DTYPES = {
+    "Name": TEXT,
+    "Full Address": TEXT,
+    "Description": TEXT,
+    "Opening Hours": TEXT,
+    "SIC Code": TEXT,
+    "Phone": TEXT,
+    "URL": TEXT,
+    "Most Common Email": TEXT,
+    "Direct Emails": TEXT,
+    "Country Code": CATEGORY,
+    "Status": CATEGORY,
+    "Establishment Longitude": FLOAT,
+    "Establishment Latitude": FLOAT,
+}
+
+# Text columns that Excel may hand over as numbers (5813 -> 5813.0 once NaNs appear)
+INTEGER_TEXT_COLUMNS = ("SIC Code", "Phone")
+
+# The C parser: pandas' pyarrow engine lets pyarrow infer types first and casts
+# afterwards, so text columns lose leading zeros ("0742" -> 742 -> "742")
+CSV_ENGINE = "c"
+
+
+def csv_read_options(columns, strict=True):
+    """`pd.read_csv` keyword arguments pinning the schema for the given CSV columns.
+
+    With `strict=False` float columns are read as text, for older CSVs whose
+    coordinates contain values that are not numbers.
+    """
+    dtypes = {name: dtype for name, dtype in BRIZO_DTYPES.items() if name in columns}
+    if not strict:
+        dtypes = {name: (TEXT if dtype == FLOAT else dtype) for name, dtype in dtypes.items()}
+    return {"dtype": dtypes, "engine": CSV_ENGINE}
+
+
+def excel_read_options():
+    """`pd.read_excel` keyword arguments that keep code columns as the text typed in the workbook.
+
+    Without them pandas turns "0742" into 742.0 before `apply_schema` ever
+    sees the column.
+    """
+    return {"dtype": {name: str for name in INTEGER_TEXT_COLUMNS}, "engine": "openpyxl"}
+
+
+def _is_number(value):
+    return isinstance(value, numbers.Real) and not isinstance(value, bool)
+
+
+def _integer_text(series):
+    """Text with whole-number cells written without ".0"; cells that already are text stay as they are.
+
+    Only number cells (and text like "5813.0") are rewritten, so leading zeros
+    in "0742" or "0123456789" survive.
+    """
+    import pandas as pd
+
+    if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+        numeric = series.astype(FLOAT)
+    else:
+        numeric = pd.to_numeric(series.where(series.map(_is_number)), errors="coerce")
+    integral = numeric.notna() & (numeric == numeric.round())
+    text = series.astype(TEXT)
+    text[integral] = numeric[integral].astype("Int64").astype(TEXT)
+    return text.str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+
+
+def apply_schema(df):
+    """Cast a freshly loaded workbook to the pinned schema before it is written to CSV."""
+    df = df.copy()
+    for name in INTEGER_TEXT_COLUMNS:
+        if name in df.columns:
+            df[name] = _integer_text(df[name])
+    for name, dtype in BRIZO_DTYPES.items():
+        if name in df.columns and name not in INTEGER_TEXT_COLUMNS:
+            try:
+                df[name] = df[name].astype(dtype)
+            except (ValueError, TypeError):
+                # Leave dirty columns as they are; validation reports the bad values
+                pass
+    return df
+
+
+def normalize_chunk(chunk):
+    """Strip float artefacts ("5813.0") from code columns of CSVs written before the schema existed."""
+    for name in INTEGER_TEXT_COLUMNS:
+        if name in chunk.columns:
+            chunk[name] = chunk[name].str.replace(r"^(\d+)\.0$", r"\1", regex=True)
+    return chunk
@@ -0,0 +1,180 @@
+import gzip
+import io
+import os
+import queue
+import threading
+
+try:
+    import zstandard
+except ImportError:  # zstd support is optional
+    zstandard = None
+
+# Transparent compression for intermediate and output artifacts.
+#
+# Writers buffer data and hand full blocks to a background thread that
+# compresses each block as an independent gzip member / zstd frame and writes
+# it out, so compression overlaps with whatever produces the data. A stream of
+# members is still a single valid .gz/.zst file, and a reader can start
+# decompressing at any member boundary, which keeps the CSV index usable.
+
+COMPRESSION_EXTENSIONS = {".gz": "gzip", ".zst": "zstd"}
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+COMPRESSION_LEVELS = {"gzip": 6, "zstd": 3}
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+WRITE_BLOCK_SIZE = 1024 * 1024
+
+
+def _check_supported(compression):
+    if compression not in (None, "gzip", "zstd"):
+        raise ValueError(f"Unsupported compression: {compression}")
+    if compression == "zstd" and zstandard is None:
+        raise ImportError("zstd compression requires the 'zstandard' package")
+
+
+def compression_for_path(path):
+    return COMPRESSION_EXTENSIONS.get(os.path.splitext(path)[1].lower())
+
+
+def with_compression_suffix(path, compression):
+    """Append the suffix for `compression` unless the path already carries it."""
+    if not compression or compression_for_path(path) == compression:
+        return path
+    return path + COMPRESSION_SUFFIXES[compression]
+
+
+def detect_compression(path):
+    with open(path, 'rb') as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        return "gzip"
+    if magic.startswith(ZSTD_MAGIC):
+        return "zstd"
+    return None
+
+
+def compress_bytes(data, compression):
+    if compression == "gzip":
+        return gzip.compress(data, compresslevel=COMPRESSION_LEVELS["gzip"], mtime=0)
+    if compression == "zstd":
+        _check_supported(compression)
+        return zstandard.ZstdCompressor(level=COMPRESSION_LEVELS["zstd"]).compress(data)
+    return data
+
+
+def decompress_bytes(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        _check_supported(compression)
+        reader = zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data), read_across_frames=True)
+        return reader.read()
+    return data
+
+
+class BackgroundCompressedWriter:
+    """File-like writer that compresses and writes blocks on a background thread."""
+
+    def __init__(self, path, compression, block_size=WRITE_BLOCK_SIZE, max_pending=8):
+        _check_supported(compression)
+        self.path = path
+        self.compression = compression
+        self.block_size = block_size
+        self.member_offsets = []
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._submitted = 0
+        self._buffer = bytearray()
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._error = None
+        self._closed = False
+        self._file = open(path, 'wb')
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            block = self._queue.get()
+            if block is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self.member_offsets.append(self._file.tell())
+                compressed = compress_bytes(block, self.compression)
+                self._file.write(compressed)
+                self.bytes_out += len(compressed)
+            except Exception as e:
+                self._error = e
+
+    def _submit(self, block):
+        if self._error is not None:
+            raise self._error
+        self.bytes_in += len(block)
+        self._submitted += 1
+        self._queue.put(bytes(block))
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        self._buffer += data
+        if len(self._buffer) >= self.block_size:
+            self._submit(self._buffer)
+            self._buffer = bytearray()
+        return len(data)
+
+    def write_member(self, data):
+        """Write `data` as its own member and return its member number (see `member_offsets`)."""
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = bytearray()
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        member_no = self._submitted
+        self._submit(data)
+        return member_no
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._buffer:
+            self._submit(self._buffer)
+            self._buffer = bytearray()
+        self._queue.put(None)
+        self._thread.join()
+        self._file.close()
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def open_artifact(path, mode='rt', compression=None):
+    """Open an artifact for reading or writing, compressing by flag or file extension.
+
+    Reads detect gzip/zstd from the file's magic bytes, so callers never need
+    to know how an input was written.
+    """
+    if 'r' in mode:
+        detected = detect_compression(path) if os.path.exists(path) else None
+        if detected == "gzip":
+            return gzip.open(path, 'rt' if 't' in mode else 'rb', encoding='utf-8' if 't' in mode else None)
+        if detected == "zstd":
+            _check_supported(detected)
+            raw = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), read_across_frames=True,
+                                                              closefd=True)
+            return io.TextIOWrapper(raw, encoding='utf-8') if 't' in mode else raw
+        return open(path, mode, encoding='utf-8' if 't' in mode else None)
+
+    compression = compression or compression_for_path(path)
+    if compression:
+        return BackgroundCompressedWriter(path, compression)
+    return open(path, mode, encoding='utf-8' if 't' in mode else None)
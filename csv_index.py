@@ -0,0 +1,204 @@
+import csv
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from compression import BackgroundCompressedWriter, compression_for_path, decompress_bytes, detect_compression
+
+# Sidecar index for the intermediate CSV.
+#
+# The index lives next to the CSV as `<csv>.idx.json` and stores the byte
+# offset of every Nth logical record (quoted fields may span several physical
+# lines) plus the total record count. Readers seek straight to a block instead
+# of scanning the file, and worker processes can read disjoint block ranges.
+# Compressed CSVs store every block as its own gzip member / zstd frame, and
+# the offsets point into the compressed file.
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 1
+DEFAULT_INDEX_EVERY = 100
+
+
+def index_path_for(csv_path):
+    return csv_path + INDEX_SUFFIX
+
+
+def _save_index(csv_path, index):
+    index_path = index_path_for(csv_path)
+    tmp_path = index_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+
+
+def _make_index(csv_path, every, row_count, header_end, offsets, end_offset, columns, compression=None):
+    return {
+        "version": INDEX_VERSION,
+        "compression": compression,
+        "every": every,
+        "row_count": row_count,
+        "header_end": header_end,
+        "offsets": offsets,
+        "end_offset": end_offset,
+        "columns": columns,
+        "csv_size": os.path.getsize(csv_path),
+    }
+
+
+def write_csv_with_index(df, csv_path, every=DEFAULT_INDEX_EVERY, compression=None):
+    """Write `df` as CSV and record the byte offset of every `every`-th row in a sidecar index."""
+    compression = compression or compression_for_path(csv_path)
+    header = df.iloc[:0].to_csv(index=False).encode('utf-8')
+    blocks = (df.iloc[start:start + every].to_csv(index=False, header=False).encode('utf-8')
+              for start in range(0, len(df), every))
+
+    if compression:
+        # Header and each block become separate members, compressed in the background
+        with BackgroundCompressedWriter(csv_path, compression) as writer:
+            writer.write_member(header)
+            members = [writer.write_member(block) for block in blocks]
+        end_offset = os.path.getsize(csv_path)
+        offsets = [writer.member_offsets[member] for member in members]
+        header_end = offsets[0] if offsets else end_offset
+    else:
+        offsets = []
+        with open(csv_path, 'wb') as f:
+            f.write(header)
+            header_end = f.tell()
+            for block in blocks:
+                offsets.append(f.tell())
+                f.write(block)
+            end_offset = f.tell()
+
+    index = _make_index(csv_path, every, len(df), header_end, offsets, end_offset,
+                        list(map(str, df.columns)), compression)
+    _save_index(csv_path, index)
+    return index
+
+
+def build_csv_index(csv_path, every=DEFAULT_INDEX_EVERY):
+    """Index an existing CSV (older runs, file_splitter parts) with one streaming pass.
+
+    Record boundaries are found by tracking quote parity per physical line, so
+    newlines inside quoted Description/Address fields do not split a record.
+    """
+    if detect_compression(csv_path):
+        raise ValueError(f"Cannot index a compressed CSV without its sidecar index: {csv_path}")
+    offsets = []
+    row_count = 0
+    header_end = None
+    in_quotes = False
+    with open(csv_path, 'rb') as f:
+        position = 0
+        for line in f:
+            record_start = not in_quotes
+            if record_start and header_end is not None and line.strip():
+                if row_count % every == 0:
+                    offsets.append(position)
+                row_count += 1
+            if line.count(b'"') % 2 == 1:
+                in_quotes = not in_quotes
+            position += len(line)
+            if header_end is None and not in_quotes:
+                header_end = position
+        end_offset = position
+
+    if header_end is None:
+        header_end = end_offset
+    with open(csv_path, 'r', encoding='utf-8', newline='') as f:
+        columns = next(csv.reader(f), [])
+
+    index = _make_index(csv_path, every, row_count, header_end, offsets, end_offset, columns)
+    _save_index(csv_path, index)
+    return index
+
+
+def load_csv_index(csv_path):
+    """Return the sidecar index for `csv_path`, or None when it is missing or stale."""
+    index_path = index_path_for(csv_path)
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if index.get("version") != INDEX_VERSION:
+        return None
+    if index.get("csv_size") != os.path.getsize(csv_path):
+        print(f"⚠️ Stale CSV index ignored: {index_path}")
+        return None
+    return index
+
+
+def load_or_build_csv_index(csv_path, every=DEFAULT_INDEX_EVERY):
+    index = load_csv_index(csv_path)
+    if index is None:
+        print(f"ℹ️ Building CSV index for: {csv_path}")
+        index = build_csv_index(csv_path, every)
+    return index
+
+
+def block_count(index):
+    return len(index["offsets"])
+
+
+def _block_end(index, block_no):
+    offsets = index["offsets"]
+    return offsets[block_no + 1] if block_no + 1 < len(offsets) else index["end_offset"]
+
+
+def read_csv_blocks(csv_path, index, start_block=0, stop_block=None, **read_csv_kwargs):
+    """Yield `(block_no, DataFrame)` for blocks in `[start_block, stop_block)`, seeking directly to each."""
+    import pandas as pd
+
+    if stop_block is None:
+        stop_block = block_count(index)
+    compression = index.get("compression")
+    with open(csv_path, 'rb') as f:
+        header = decompress_bytes(f.read(index["header_end"]), compression)
+        for block_no in range(start_block, stop_block):
+            start = index["offsets"][block_no]
+            f.seek(start)
+            data = decompress_bytes(f.read(_block_end(index, block_no) - start), compression)
+            yield block_no, pd.read_csv(io.BytesIO(header + data), **read_csv_kwargs)
+
+
+def read_csv_block(csv_path, index, block_no, **read_csv_kwargs):
+    """Read a single block; safe to call from several threads at once."""
+    _, df = next(read_csv_blocks(csv_path, index, block_no, block_no + 1, **read_csv_kwargs))
+    return df
+
+
+def split_blocks(index, parts):
+    """Split the index into at most `parts` contiguous, balanced `(start_block, stop_block)` ranges."""
+    total = block_count(index)
+    parts = max(1, min(parts, total))
+    ranges = []
+    for part in range(parts):
+        start = total * part // parts
+        stop = total * (part + 1) // parts
+        if start < stop:
+            ranges.append((start, stop))
+    return ranges
+
+
+def _apply_to_range(csv_path, index, start_block, stop_block, fn, read_csv_kwargs):
+    return [fn(block_no, df) for block_no, df in
+            read_csv_blocks(csv_path, index, start_block, stop_block, **read_csv_kwargs)]
+
+
+def map_blocks_parallel(csv_path, fn, workers=os.cpu_count(), index=None, **read_csv_kwargs):
+    """Run `fn(block_no, df)` over every block using `workers` processes reading disjoint ranges.
+
+    `fn` must be a picklable top-level function. Results are yielded in block order.
+    """
+    if index is None:
+        index = load_or_build_csv_index(csv_path)
+    ranges = split_blocks(index, workers)
+    with ProcessPoolExecutor(max_workers=len(ranges) or 1) as pool:
+        futures = [pool.submit(_apply_to_range, csv_path, index, start, stop, fn, read_csv_kwargs)
+                   for start, stop in ranges]
+        for future in futures:
+            yield from future.result()
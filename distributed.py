@@ -0,0 +1,221 @@
+import os
+import socket
+import sqlite3
+import threading
+import time
+import zlib
+
+from json_stream import iter_json_objects, JsonArrayWriter
+
+# Distributed runs over a shared lease table.
+#
+# The CSV's chunk blocks are split into ranges, and each range is one row in a
+# SQLite lease table next to the CSV. Workers (processes on one host, or hosts
+# sharing the filesystem) claim a range, renew the lease with heartbeats while
+# they post it, and record the output files they wrote when they complete it.
+# A lease that is not renewed expires and is claimed again, so a crashed
+# worker's range is picked up by someone else. Every range hashes to a home
+# partition; a worker claims its own partition first and then helps with the
+# others, which keeps workers on mostly disjoint ranges without any
+# coordination beyond the table.
+#
+# SQLite's locking needs a filesystem with working POSIX locks (local disk or
+# a properly configured NFSv4 mount).
+
+LEASE_DB_NAME = "leases.sqlite"
+LEASE_SECONDS = 60
+RANGE_BLOCKS = 10
+
+PENDING = "pending"
+LEASED = "leased"
+DONE = "done"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS leases (
+    range_id INTEGER PRIMARY KEY,
+    start_block INTEGER NOT NULL,
+    stop_block INTEGER NOT NULL,
+    partition INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    expires_at REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    output_json TEXT,
+    failed_json TEXT,
+    posted INTEGER,
+    failed INTEGER
+);
+"""
+
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def partition_for(key, partitions):
+    return zlib.crc32(str(key).encode("utf-8")) % partitions
+
+
+class LeaseTable:
+    """SQLite-backed table of block ranges and the workers leasing them."""
+
+    def __init__(self, path):
+        self.path = path
+        # Autocommit mode; claims and completions run inside explicit IMMEDIATE transactions
+        self._conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._conn.executescript(_SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def plan(self, total_blocks, range_blocks=RANGE_BLOCKS, partitions=1, csv_path=None):
+        """Create one pending lease per `range_blocks` blocks; a table that is already planned is kept."""
+        def create(conn):
+            if conn.execute("SELECT COUNT(*) FROM leases").fetchone()[0]:
+                return False
+            rows = []
+            for range_id, start in enumerate(range(0, total_blocks, range_blocks)):
+                rows.append((range_id, start, min(start + range_blocks, total_blocks),
+                             partition_for(range_id, partitions), PENDING))
+            conn.executemany("INSERT INTO leases (range_id, start_block, stop_block, partition, status) "
+                             "VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [
+                ("partitions", str(partitions)),
+                ("csv_path", csv_path or ""),
+            ])
+            return True
+        return self._transaction(create)
+
+    def meta(self, key, default=None):
+        row = self._conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else default
+
+    @property
+    def partitions(self):
+        return int(self.meta("partitions", 1))
+
+    def claim(self, worker_id, lease_seconds=LEASE_SECONDS, partition=None):
+        """Lease the next free or expired range, preferring `partition`; None when nothing is left."""
+        if partition is None:
+            partition = partition_for(worker_id, self.partitions)
+
+        def claim(conn):
+            now = time.time()
+            row = conn.execute(
+                "SELECT range_id, start_block, stop_block FROM leases "
+                "WHERE status = ? OR (status = ? AND expires_at < ?) "
+                "ORDER BY partition = ? DESC, range_id LIMIT 1",
+                (PENDING, LEASED, now, partition)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE leases SET status = ?, owner = ?, expires_at = ?, attempts = attempts + 1 "
+                         "WHERE range_id = ?", (LEASED, worker_id, now + lease_seconds, row[0]))
+            return {"range_id": row[0], "start_block": row[1], "stop_block": row[2]}
+        return self._transaction(claim)
+
+    def heartbeat(self, worker_id, range_id, lease_seconds=LEASE_SECONDS):
+        """Extend a lease; False when the worker no longer owns it (it expired and was reclaimed)."""
+        def renew(conn):
+            cursor = conn.execute("UPDATE leases SET expires_at = ? WHERE range_id = ? AND owner = ? AND status = ?",
+                                  (time.time() + lease_seconds, range_id, worker_id, LEASED))
+            return cursor.rowcount == 1
+        return self._transaction(renew)
+
+    def complete(self, worker_id, range_id, output_json, failed_json=None, posted=0, failed=0):
+        """Mark a range done with the files its worker wrote; False when the lease was lost."""
+        def complete(conn):
+            cursor = conn.execute(
+                "UPDATE leases SET status = ?, expires_at = NULL, output_json = ?, failed_json = ?, "
+                "posted = ?, failed = ? WHERE range_id = ? AND owner = ? AND status = ?",
+                (DONE, output_json, failed_json, posted, failed, range_id, worker_id, LEASED))
+            return cursor.rowcount == 1
+        return self._transaction(complete)
+
+    def release(self, worker_id, range_id):
+        """Hand a range back right away (e.g. the worker hit an error) instead of waiting for expiry."""
+        def release(conn):
+            conn.execute("UPDATE leases SET status = ?, owner = NULL, expires_at = NULL "
+                         "WHERE range_id = ? AND owner = ? AND status = ?",
+                         (PENDING, range_id, worker_id, LEASED))
+        self._transaction(release)
+
+    def status(self):
+        counts = {PENDING: 0, LEASED: 0, DONE: 0}
+        for status, count in self._conn.execute("SELECT status, COUNT(*) FROM leases GROUP BY status"):
+            counts[status] = count
+        counts["expired"] = self._conn.execute(
+            "SELECT COUNT(*) FROM leases WHERE status = ? AND expires_at < ?", (LEASED, time.time())).fetchone()[0]
+        counts["reclaimed"] = self._conn.execute(
+            "SELECT COUNT(*) FROM leases WHERE attempts > 1").fetchone()[0]
+        return counts
+
+    def completed(self):
+        return self._conn.execute("SELECT range_id, output_json, failed_json, posted, failed FROM leases "
+                                  "WHERE status = ? ORDER BY range_id", (DONE,)).fetchall()
+
+
+class LeaseHeartbeat:
+    """Background thread renewing one lease; `lost` is set when the lease was taken over."""
+
+    def __init__(self, table, worker_id, range_id, lease_seconds=LEASE_SECONDS):
+        self.table = table
+        self.worker_id = worker_id
+        self.range_id = range_id
+        self.lease_seconds = lease_seconds
+        self.lost = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"heartbeat-{range_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.table.heartbeat(self.worker_id, self.range_id, self.lease_seconds):
+                    self.lost.set()
+                    return
+            except sqlite3.OperationalError:
+                # Database busy for longer than the connect timeout; try again next beat
+                continue
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+
+def merge_range_outputs(table, work_dir, output_json_path, failed_json_path):
+    """Stream every completed range's bars into one output file and one failed-bars file."""
+    posted = failed = 0
+    failed_writer = None
+    with JsonArrayWriter(output_json_path) as writer:
+        try:
+            for _, output_json, failed_json, _, _ in table.completed():
+                for bar_object in iter_json_objects(os.path.join(work_dir, output_json)):
+                    writer.write(bar_object)
+                    posted += 1
+                if not failed_json:
+                    continue
+                if failed_writer is None:
+                    failed_writer = JsonArrayWriter(failed_json_path)
+                for bar_object in iter_json_objects(os.path.join(work_dir, failed_json)):
+                    failed_writer.write(bar_object)
+                    failed += 1
+        finally:
+            if failed_writer is not None:
+                failed_writer.close()
+    return posted, failed
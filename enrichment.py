@@ -0,0 +1,107 @@
+import os
+import threading
+
+# Reference-data enrichment.
+#
+# Every table in REFERENCE_TABLES is a small CSV in reference/ keyed by a
+# normalized code. Tables are loaded once into DataFrames indexed by that key
+# (text columns as categoricals), and each chunk is enriched with one
+# vectorized lookup per table (`reindex` on the unique key index, i.e. a hash
+# join) instead of per-row dict lookups. The looked-up columns land in the
+# chunk under their output field names and `field_spec()` maps them onto the
+# bar, so a new table is a CSV plus a registry entry; the transform loop does
+# not change. Codes with no match are counted per table for the run report.
+
+REFERENCE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "reference")
+UNMATCHED_SHOWN = 10
+
+
+def _sic4(codes):
+    # "5813", "5813.0" and 6/8-digit codes ("581301") all join on the 4-digit SIC
+    return codes.str.replace(r"\D", "", regex=True).str.slice(0, 4)
+
+
+def _upper(codes):
+    return codes.str.strip().str.upper()
+
+
+NORMALIZERS = {"sic4": _sic4, "upper": _upper}
+
+REFERENCE_TABLES = [
+    {
+        "name": "sic",
+        "file": "sic_codes.csv",
+        "source": "SIC Code",
+        "key": "sic_code",
+        "normalize": "sic4",
+        "fields": {"description": "sic_description", "division": "sic_division"},
+    },
+    {
+        "name": "country",
+        "file": "countries.csv",
+        "source": "Country Code",
+        "key": "alias",
+        "normalize": "upper",
+        "fields": {"iso2": "country", "name": "country_name", "region": "region"},
+    },
+]
+
+
+class Enricher:
+    """Reference tables held in memory, joined onto DataFrame chunks."""
+
+    def __init__(self, tables=REFERENCE_TABLES, reference_dir=REFERENCE_DIR):
+        import pandas as pd
+
+        self.tables = []
+        for table in tables:
+            frame = pd.read_csv(os.path.join(reference_dir, table["file"]), dtype="string")
+            frame[table["key"]] = NORMALIZERS[table["normalize"]](frame[table["key"]])
+            frame = frame.drop_duplicates(table["key"]).set_index(table["key"])
+            frame = frame[list(table["fields"])].rename(columns=table["fields"]).astype("category")
+            self.tables.append((table, frame))
+        self.matched = {table["name"]: 0 for table in tables}
+        self.unmatched = {table["name"]: {} for table in tables}
+        self._lock = threading.Lock()
+
+    def field_spec(self, columns=()):
+        """BAR_FIELD_SPEC-style entries for the enriched columns (only tables whose source is in `columns`)."""
+        return [{"field": field, "source": field}
+                for table, _ in self.tables if table["source"] in columns
+                for field in table["fields"].values()]
+
+    def enrich(self, chunk):
+        """Add every table's fields to `chunk`; rows without a match get missing values."""
+        for table, frame in self.tables:
+            if table["source"] not in chunk.columns:
+                continue
+            keys = NORMALIZERS[table["normalize"]](chunk[table["source"]].astype("string"))
+            looked_up = frame.reindex(keys.to_numpy())
+            hit = looked_up.iloc[:, 0].notna().to_numpy()
+            chunk = chunk.assign(**{column: looked_up[column].to_numpy() for column in looked_up.columns})
+
+            misses = keys[~hit & keys.notna() & (keys != "")].value_counts()
+            with self._lock:
+                self.matched[table["name"]] += int(hit.sum())
+                unmatched = self.unmatched[table["name"]]
+                for code, count in misses.items():
+                    unmatched[code] = unmatched.get(code, 0) + int(count)
+        return chunk
+
+    def report(self):
+        return {
+            name: {
+                "matched": self.matched[name],
+                "unmatched": sum(codes.values()),
+                "unmatched_codes": dict(sorted(codes.items(), key=lambda item: -item[1])),
+            }
+            for name, codes in self.unmatched.items()
+        }
+
+    def format(self):
+        lines = ["🔗 Enrichment:"]
+        for name, result in self.report().items():
+            lines.append(f"- {name}: {result['matched']} matched, {result['unmatched']} unmatched")
+            for code, count in list(result["unmatched_codes"].items())[:UNMATCHED_SHOWN]:
+                lines.append(f"    {code!r}: {count}")
+        return "\n".join(lines)
@@ -0,0 +1,179 @@
+import heapq
+import itertools
+import json
+import os
+import tempfile
+
+from json_stream import iter_json_objects, JsonArrayWriter
+
+# External merge sort of bar files by key.
+#
+# Bars are kept in memory only as their encoded JSON lines. When the buffered
+# lines reach `memory_bytes` they are sorted and spilled to a run file; the
+# runs are then k-way merged with heapq.merge (at most `fan_in` files open at
+# once, extra passes when there are more runs). Peak memory is the budget plus
+# one line per open run, whatever the size of the input. The merge can drop
+# duplicate keys (keeping the first bar in input order) or emit one object per
+# key holding that key's bars.
+
+MEMORY_BYTES = 64 * 1024 * 1024
+FAN_IN = 64
+# Rough per-line overhead of the buffered (key, sequence, line) tuples
+_ITEM_OVERHEAD = 120
+
+
+def _address_parts(bar_object):
+    # "770 5th Ave, San Diego, CA 92101" -> ("CA", "San Diego"); parsed address components win when present
+    components = bar_object.get("address_components")
+    if components:
+        return (components.get("state") or "").upper(), components.get("city") or ""
+    parts = [p.strip() for p in str(bar_object.get("address") or "").split(",")]
+    if len(parts) < 3:
+        return "", ""
+    state = parts[-1].split(" ")[0] if parts[-1] else ""
+    return state.upper(), parts[-2]
+
+
+def state_city_key(bar_object):
+    state, city = _address_parts(bar_object)
+    return [state, city.lower(), bar_object.get("slug") or ""]
+
+
+SORT_KEYS = {
+    "slug": lambda bar_object: bar_object.get("slug") or "",
+    "state_city": state_city_key,
+}
+
+
+def _group_key(key):
+    # state_city groups on (state, city) and uses the slug only to order bars within a group
+    return key[:2] if isinstance(key, list) else key
+
+
+class ExternalSorter:
+    """Sort encoded bars by key with bounded memory, spilling sorted runs to `work_dir`."""
+
+    def __init__(self, key_fn, memory_bytes=MEMORY_BYTES, work_dir=None, fan_in=FAN_IN):
+        self.key_fn = key_fn
+        self.memory_bytes = memory_bytes
+        self.fan_in = max(2, fan_in)
+        self._tmp = tempfile.TemporaryDirectory(prefix="bar-sort-", dir=work_dir)
+        self.work_dir = self._tmp.name
+        self.records = 0
+        self.runs = 0
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._run_paths = []
+
+    def add(self, bar_object):
+        line = json.dumps(bar_object, ensure_ascii=False)
+        self._buffer.append((self.key_fn(bar_object), self.records, line))
+        self.records += 1
+        self._buffered_bytes += len(line) + _ITEM_OVERHEAD
+        if self._buffered_bytes >= self.memory_bytes:
+            self._spill()
+
+    def _new_run_path(self):
+        self.runs += 1
+        return os.path.join(self.work_dir, f"run-{self.runs:06d}.txt")
+
+    def _spill(self):
+        if not self._buffer:
+            return
+        self._buffer.sort(key=lambda item: (item[0], item[1]))
+        path = self._new_run_path()
+        with open(path, 'w', encoding='utf-8') as f:
+            for key, _, line in self._buffer:
+                # JSON never contains a raw tab, so the first tab separates key from bar
+                f.write(json.dumps(key, ensure_ascii=False) + "\t" + line + "\n")
+        self._run_paths.append(path)
+        self._buffer = []
+        self._buffered_bytes = 0
+
+    @staticmethod
+    def _read_run(path):
+        with open(path, 'r', encoding='utf-8') as f:
+            for text in f:
+                key, line = text.rstrip("\n").split("\t", 1)
+                yield json.loads(key), line
+
+    def _merge(self, paths):
+        # heapq.merge breaks ties by iterable order, and runs are in input order, so equal keys stay stable
+        return heapq.merge(*(self._read_run(p) for p in paths), key=lambda item: item[0])
+
+    def sorted_lines(self):
+        """Yield `(key, encoded_bar)` in key order; input order is kept for equal keys."""
+        if not self._run_paths:
+            # Everything fit in memory: no run files at all
+            self._buffer.sort(key=lambda item: (item[0], item[1]))
+            for key, _, line in self._buffer:
+                yield key, line
+            self._buffer = []
+            return
+        self._spill()
+        paths = self._run_paths
+        while len(paths) > self.fan_in:
+            merged_paths = []
+            for i in range(0, len(paths), self.fan_in):
+                batch = paths[i:i + self.fan_in]
+                path = self._new_run_path()
+                with open(path, 'w', encoding='utf-8') as f:
+                    for key, line in self._merge(batch):
+                        f.write(json.dumps(key, ensure_ascii=False) + "\t" + line + "\n")
+                for old in batch:
+                    os.remove(old)
+                merged_paths.append(path)
+            paths = merged_paths
+        yield from self._merge(paths)
+
+    def close(self):
+        self._tmp.cleanup()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def sort_bars_file(input_path, output_path, key="slug", memory_bytes=MEMORY_BYTES, mode=None,
+                   work_dir=None):
+    """Write the bars of `input_path` to `output_path` sorted by `key`.
+
+    `mode="dedup"` keeps the first bar per key, `mode="group"` writes one
+    `{"key": ..., "count": n, "bars": [...]}` object per key (a group is held
+    in memory while it is written). Returns counts for the report.
+    """
+    key_fn = SORT_KEYS[key]
+    stats = {"records": 0, "written": 0, "duplicates": 0, "groups": 0, "runs": 0}
+    # Keep the .json(.gz) suffix so the temporary file is compressed like the output
+    if ".json" in output_path:
+        tmp_path = output_path.replace(".json", ".sorting.json", 1)
+    else:
+        tmp_path = output_path + ".sorting"
+    with ExternalSorter(key_fn, memory_bytes, work_dir=work_dir) as sorter:
+        for bar_object in iter_json_objects(input_path):
+            sorter.add(bar_object)
+        stats["records"] = sorter.records
+
+        with JsonArrayWriter(tmp_path) as writer:
+            sorted_lines = sorter.sorted_lines()
+            if mode is None:
+                for _, line in sorted_lines:
+                    writer.write_encoded(line)
+            else:
+                # Dedup compares whole keys; grouping by state_city ignores the slug tiebreak
+                group_fn = (lambda item: item[0]) if mode == "dedup" else (lambda item: _group_key(item[0]))
+                for group_key, items in itertools.groupby(sorted_lines, key=group_fn):
+                    if mode == "dedup":
+                        writer.write_encoded(next(items)[1])
+                        stats["duplicates"] += sum(1 for _ in items)
+                    else:
+                        bars = [json.loads(line) for _, line in items]
+                        writer.write({"key": group_key, "count": len(bars), "bars": bars})
+                    stats["groups"] += 1
+            stats["written"] = writer.count
+        stats["runs"] = sorter.runs
+    # Only replace the output (which may be the input) once the sort finished
+    os.replace(tmp_path, output_path)
+    return stats
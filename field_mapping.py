@@ -0,0 +1,106 @@
+import ast
+
+# Declarative source -> document field mapping.
+#
+# A spec is a list of field entries in output order. `compile_mapping` turns
+# a spec plus the input's column order into one generated Python function
+# that reads values straight out of row tuples by position, so the per-row
+# work is just the coercions and derivations the spec asks for: no dict per
+# row, no `row_dict.get` calls and no spec interpretation in the hot loop.
+#
+# Field entry keys:
+#   field     output key
+#   source    input column, or a list of columns passed to `derive` in order
+#   default   value used when a source column is missing from the input (None)
+#   coerce    inline coercion of a single source value, see COERCIONS
+#   derive    name of a function in the derivations registry, called with the
+#             source values (or with the values of the `from` fields)
+#   from      earlier output field(s) to derive from instead of columns
+#   const     literal value; lists and dicts are rebuilt for every row
+#   required  drop the row (return None) when the value is falsy
+
+COERCIONS = {
+    "or_none": "({} or None)",
+    "str": "str({})",
+    "strip": "str({}).strip()",
+}
+
+
+def _literal(value):
+    # Defaults and constants are emitted as source, so only literals are allowed
+    text = repr(value)
+    if ast.literal_eval(text) != value:
+        raise ValueError(f"Not a literal value: {value!r}")
+    return text
+
+
+def _as_list(value):
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+
+def generate_source(spec, columns, name="transform"):
+    """Python source of the row-tuple transformer for `spec` over `columns`."""
+    positions = {column: i for i, column in enumerate(columns)}
+    lines = [f"def {name}(row):"]
+    variables = {}
+    for i, entry in enumerate(spec):
+        field = entry["field"]
+        var = f"f{i}"
+
+        if "const" in entry:
+            expr = _literal(entry["const"])
+        else:
+            if "from" in entry:
+                args = [variables[f] for f in _as_list(entry["from"])]
+            else:
+                default = _literal(entry.get("default"))
+                args = [f"row[{positions[c]}]" if c in positions else default for c in _as_list(entry["source"])]
+            if "derive" in entry:
+                expr = f"_derive_{entry['derive']}({', '.join(args)})"
+            else:
+                if len(args) != 1:
+                    raise ValueError(f"Field {field!r} maps several sources without a derive function")
+                expr = args[0]
+                if "coerce" in entry:
+                    expr = COERCIONS[entry["coerce"]].format(expr)
+
+        lines.append(f"    {var} = {expr}")
+        if entry.get("required"):
+            lines.append(f"    if not {var}:")
+            lines.append("        return None")
+        variables[field] = var
+
+    body = ", ".join(f"{field!r}: {var}" for field, var in variables.items())
+    lines.append(f"    return {{{body}}}")
+    return "\n".join(lines) + "\n"
+
+
+def compile_mapping(spec, columns, derivations=None):
+    """Compile `spec` for rows laid out as `columns` into `fn(row_tuple) -> dict | None`."""
+    derivations = derivations or {}
+    for entry in spec:
+        if "derive" in entry and entry["derive"] not in derivations:
+            raise ValueError(f"Unknown derive function {entry['derive']!r} for field {entry['field']!r}")
+    source = generate_source(spec, columns)
+    namespace = {f"_derive_{name}": fn for name, fn in derivations.items()}
+    exec(compile(source, "<field mapping>", "exec"), namespace)
+    transform = namespace["transform"]
+    transform.source = source
+    return transform
+
+
+def source_columns(spec):
+    """Every input column a spec reads, in first-use order."""
+    columns = []
+    for entry in spec:
+        if "source" in entry and "from" not in entry:
+            for column in _as_list(entry["source"]):
+                if column not in columns:
+                    columns.append(column)
+    return columns
+
+
+def null_free_rows(chunk):
+    """Row tuples of a DataFrame chunk with every missing value (NaN, NA, NaT) replaced by None."""
+    objects = chunk.astype(object)
+    return objects.where(chunk.notna(), None).itertuples(index=False, name=None)
@@ -0,0 +1,234 @@
+import re
+
+# Opening-hours parser.
+#
+# One compiled token pattern walks the string once (finditer) and a small
+# state machine turns the tokens into per-day intervals; there is no
+# strptime and no per-segment regex. Accepted on top of the V1.6 formats:
+#
+#   Daily 11am-2am / Every day / Weekdays / Weekends
+#   Mon 11am-2pm, 5pm-10pm          split shifts (also "&", "and")
+#   Mon, Wed, Fri 5pm-2am           day lists
+#   Mon-Fri: 11am-10pm              a colon after the days
+#   Monday-Thursday 4pm-12am        full and other common day names
+#   Closed / Sun Closed             whole week or single days closed
+#   Open 24 hours / 24/7            00:00-00:00, open around the clock
+#   11am-10pm                       no days at all means every day not named yet
+#   17:00-23:30                     24-hour times
+#
+# A segment naming days replaces what earlier segments said about those days
+# (like V1.6), except when it names exactly the same days as the segment
+# right before it: "Mon-Fri 11am-2pm, Mon-Fri 5pm-9:30pm" is a split shift.
+# Hours without days after a segment that named days only cover the days not
+# named so far, so "Sun Closed, 11am-10pm" keeps Sunday closed.
+# Unparseable segments are skipped, as before; hours_are_valid() tells whether
+# any was, and is what validation checks opening hours with.
+
+WEEK_DAYS = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+ALL_DAYS = tuple(range(7))
+WEEKDAYS = (0, 1, 2, 3, 4)
+WEEKENDS = (5, 6)
+ALL_DAY = ("00:00", "00:00")
+CACHE_SIZE = 4096  # distinct time spellings / hours strings remembered
+
+_DAY_NAMES = {
+    "mon": 0, "monday": 0,
+    "tue": 1, "tues": 1, "tuesday": 1,
+    "wed": 2, "weds": 2, "wednesday": 2,
+    "thu": 3, "thur": 3, "thurs": 3, "thursday": 3,
+    "fri": 4, "friday": 4,
+    "sat": 5, "saturday": 5,
+    "sun": 6, "sunday": 6,
+}
+
+_TIME = r"\d{1,2}(?::\d{2})?\s*[ap]\.?m\.?|noon|midnight|\d{1,2}:\d{2}"
+_DASH = r"[-–—]|to\b|till\b|until\b"
+
+# Matched against the lowercased string. Leading whitespace is part of every
+# token, and "start-end" is a single token, so a typical segment is 2-3 tokens.
+# A colon after a day or day group belongs to it.
+_TOKEN = re.compile(rf"""\s*(?:
+    (?P<interval>(?P<start>{_TIME})\s*(?:{_DASH})\s*(?P<end>{_TIME}))
+  | (?P<day>(?:mon|tue|wed|thu|fri|sat|sun)[a-z]*)(?:\s*:)?
+  | (?P<sep>[,;&|/]|and\b)
+  | (?P<dash>{_DASH})
+  | (?P<allday>open\s*24\s*(?:hours|hrs|h)\b|24\s*hours\b|24/7)
+  | (?P<group>daily|every\s*day|7\s*days(?:\s*a\s*week)?|weekdays|weekends?)(?:\s*:)?
+  | (?P<closed>closed)
+  | (?P<filler>open\b|hours\b|hrs\b|from\b)
+  | (?P<other>\S)
+)""", re.VERBOSE)
+
+_time_cache = {}
+_intervals_cache = {}
+_valid_cache = {}
+
+
+def parse_time(text):
+    """"11:30pm" -> "23:30"; None when the time is not valid. Results are cached per spelling."""
+    try:
+        return _time_cache[text]
+    except KeyError:
+        pass
+    lower = text.lower().replace(".", "").replace(" ", "")
+    result = None
+    if lower == "noon":
+        result = "12:00"
+    elif lower == "midnight":
+        result = "00:00"
+    else:
+        suffix = lower[-2:] if lower.endswith(("am", "pm")) else ""
+        digits = lower[:-2] if suffix else lower
+        hours, _, minutes = digits.partition(":")
+        hour, minute = int(hours), int(minutes or 0)
+        if minute < 60:
+            if suffix and 1 <= hour <= 12:
+                result = f"{hour % 12 + (12 if suffix == 'pm' else 0):02d}:{minute:02d}"
+            elif not suffix and hour < 24:
+                result = f"{hour:02d}:{minute:02d}"
+    if len(_time_cache) < CACHE_SIZE:
+        _time_cache[text] = result
+    return result
+
+
+def _expand(start, end):
+    if start <= end:
+        return tuple(range(start, end + 1))
+    return tuple(range(start, 7)) + tuple(range(0, end + 1))
+
+
+def scan_intervals(hours_str):
+    """Per-day lists of `(start, end)` "HH:MM" pairs, Monday first; empty lists are closed days."""
+    return _scan(hours_str)[0]
+
+
+def _scan(hours_str):
+    """`(scan_intervals() result, whether every segment was read)`."""
+    week = [[] for _ in WEEK_DAYS]
+    if not isinstance(hours_str, str):
+        return week, False
+
+    days = []            # days collected for the segment being read
+    range_from = None    # day before a dash, waiting for the end of a range
+    current = None       # days the last interval applied to (split shifts continue them)
+    previous = None      # days named by the previous segment
+    named = set()        # days any segment has named so far
+    skipping = False     # inside an unparseable segment, until the next separator
+    skipped = False      # some segment was skipped
+    read = False         # some segment set hours or closed days
+
+    for match in _TOKEN.finditer(hours_str.lower()):
+        kind = match.lastgroup
+        if kind == "filler":
+            continue
+        if kind == "sep":
+            if skipping:
+                # Days named by the skipped segment must not leak into the next one, and
+                # the next segment is not "right after" the one before the skipped one
+                days = []
+                previous = None
+            skipped = skipped or range_from is not None
+            skipping = False
+            range_from = None
+            continue
+        if skipping:
+            continue
+
+        if kind == "interval":
+            start = parse_time(match.group("start"))
+            end = parse_time(match.group("end"))
+            if start is None or end is None or range_from is not None:
+                skipping = skipped = True
+                continue
+            interval = (start, end)
+            read = True
+            if days:
+                target = tuple(days)
+                if target != previous:
+                    for day in target:
+                        week[day] = []
+                previous = current = target
+                named.update(target)
+                days = []
+            elif current is None:
+                current = previous = tuple(day for day in ALL_DAYS if day not in named)
+            for day in current:
+                if interval not in week[day]:
+                    week[day].append(interval)
+        elif kind == "dash":
+            if days and range_from is None:
+                range_from = days.pop()
+            else:
+                skipping = skipped = True
+        elif kind == "day":
+            name = match.group(kind)
+            day = _DAY_NAMES.get(name, _DAY_NAMES.get(name[:-1]) if name.endswith("s") else None)
+            if day is None:
+                skipping = skipped = True
+            elif range_from is not None:
+                days.extend(d for d in _expand(range_from, day) if d not in days)
+                range_from = None
+            elif day not in days:
+                days.append(day)
+        elif kind == "group":
+            word = match.group(kind)
+            group = WEEKDAYS if word.startswith("weekday") else WEEKENDS if word.startswith("weekend") else ALL_DAYS
+            days.extend(d for d in group if d not in days)
+        elif kind == "closed" or kind == "allday":
+            target = tuple(days) or ALL_DAYS
+            for day in target:
+                week[day] = [ALL_DAY] if kind == "allday" else []
+            previous = target
+            named.update(target)
+            read = True
+            current = None
+            days = []
+        else:
+            skipping = skipped = True
+    return week, read and not skipped and not days and range_from is None
+
+
+def parse_intervals(hours_str):
+    """scan_intervals() as tuples, memoized per hours string.
+
+    The same few hours strings repeat across thousands of rows (chains,
+    "Mon-Sun 11am-2am"), so most rows are a dict lookup.
+    """
+    try:
+        return _intervals_cache[hours_str]
+    except (KeyError, TypeError):
+        pass
+    week = tuple(tuple(day) for day in scan_intervals(hours_str))
+    if isinstance(hours_str, str) and len(_intervals_cache) < CACHE_SIZE:
+        _intervals_cache[hours_str] = week
+    return week
+
+
+def hours_are_valid(hours_str):
+    """True when every segment of `hours_str` is one the parser reads; memoized per string like parse_intervals."""
+    try:
+        return _valid_cache[hours_str]
+    except (KeyError, TypeError):
+        pass
+    valid = _scan(hours_str)[1]
+    if isinstance(hours_str, str) and len(_valid_cache) < CACHE_SIZE:
+        _valid_cache[hours_str] = valid
+    return valid
+
+
+def parse_business_hours(hours_str):
+    """Business hours in the bar format, one entry per weekday.
+
+    Days with several intervals keep the first start and last end in
+    start_time/end_time and list every interval under "intervals".
+    """
+    business_hours = []
+    for day, intervals in zip(WEEK_DAYS, parse_intervals(hours_str)):
+        if not intervals:
+            business_hours.append({"day": day, "is_closed": True})
+            continue
+        entry = {"day": day, "is_closed": False, "start_time": intervals[0][0], "end_time": intervals[-1][1]}
+        if len(intervals) > 1:
+            entry["intervals"] = [{"start_time": start, "end_time": end} for start, end in intervals]
+        business_hours.append(entry)
+    return business_hours
@@ -0,0 +1,104 @@
+import datetime
+import json
+import os
+import time
+
+# Inbox watching for the daemon mode.
+#
+# `InboxWatcher.ready_files()` reports files dropped into the inbox once they
+# are fully written: the size and mtime must stay unchanged for
+# `settle_seconds` across polls, and names used by copy tools for partial
+# files (.part, .tmp, ~$...) are ignored. `JobStatus` keeps a small JSON file
+# per job that is replaced atomically on every state change, so `cat` or a
+# monitoring script never sees a half-written status.
+
+INBOX_EXTENSIONS = (".xlsx", ".csv", ".csv.gz", ".csv.zst")
+PARTIAL_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial")
+SETTLE_SECONDS = 5
+POLL_SECONDS = 2
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat()
+
+
+def is_inbox_file(name):
+    lower = name.lower()
+    if lower.startswith((".", "~$")) or lower.endswith(PARTIAL_SUFFIXES):
+        return False
+    return lower.endswith(INBOX_EXTENSIONS)
+
+
+class InboxWatcher:
+    def __init__(self, inbox_dir, settle_seconds=SETTLE_SECONDS):
+        self.inbox_dir = inbox_dir
+        self.settle_seconds = settle_seconds
+        self._seen = {}  # path -> (size, mtime, stable since)
+        os.makedirs(inbox_dir, exist_ok=True)
+
+    def ready_files(self):
+        """Inbox files whose size and mtime have not changed for `settle_seconds`, oldest first."""
+        now = time.monotonic()
+        ready = []
+        current = {}
+        for entry in os.scandir(self.inbox_dir):
+            if not entry.is_file() or not is_inbox_file(entry.name):
+                continue
+            stat = entry.stat()
+            signature = (stat.st_size, stat.st_mtime_ns)
+            previous = self._seen.get(entry.path)
+            stable_since = previous[2] if previous and previous[:2] == signature else now
+            current[entry.path] = signature + (stable_since,)
+            if stat.st_size and now - stable_since >= self.settle_seconds:
+                ready.append((stat.st_mtime_ns, entry.path))
+        self._seen = current
+        return [path for _, path in sorted(ready)]
+
+    def pending(self):
+        """Number of inbox files seen on the last poll (settled or still being written)."""
+        return len(self._seen)
+
+    def forget(self, path):
+        self._seen.pop(path, None)
+
+
+class JobStatus:
+    """Status file `<jobs_dir>/<job_id>.json` for one inbox job."""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+
+    @classmethod
+    def create(cls, jobs_dir, job_id, source, **fields):
+        status = cls(os.path.join(jobs_dir, f"{job_id}.json"),
+                     {"job_id": job_id, "source": source, "state": QUEUED, "queued_at": _now(), **fields})
+        status.write()
+        return status
+
+    @classmethod
+    def load(cls, path):
+        # Worker processes pick up the status file the daemon created when it queued the job
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(path, json.load(f))
+
+    def update(self, **fields):
+        self.data.update(fields)
+        self.write()
+
+    def started(self, pid=None):
+        self.update(state=RUNNING, started_at=_now(), pid=pid)
+
+    def finished(self, outputs=None, error=None):
+        self.update(state=FAILED if error else DONE, finished_at=_now(), outputs=outputs or {}, error=error)
+
+    def write(self):
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(tmp_path, self.path)
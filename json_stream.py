@@ -0,0 +1,91 @@
+import json
+
+from compression import open_artifact
+
+# Incremental reading and writing of large JSON arrays.
+#
+# `iter_json_objects` walks a file one object at a time with memory bounded by
+# the read size plus the largest single object. It accepts the flat arrays
+# written by V1.6, the array-of-chunk-arrays written by V1.5's
+# process_large_csv, and NDJSON, and reads compressed files transparently.
+
+READ_SIZE = 64 * 1024
+_WHITESPACE = " \t\r\n,"
+_decoder = json.JSONDecoder()
+
+
+def iter_json_objects(path, read_size=READ_SIZE):
+    """Yield every JSON object in `path`, flattening any enclosing arrays."""
+    with open_artifact(path, 'rt') as f:
+        buffer = ""
+        pos = 0
+        depth = 0
+        eof = False
+        while True:
+            # Skip separators and array brackets between objects
+            while pos < len(buffer):
+                char = buffer[pos]
+                if char in _WHITESPACE:
+                    pos += 1
+                elif char == "[":
+                    depth += 1
+                    pos += 1
+                elif char == "]":
+                    depth -= 1
+                    pos += 1
+                else:
+                    break
+
+            if pos < len(buffer):
+                if buffer[pos] != "{":
+                    raise ValueError(f"Unexpected {buffer[pos]!r} at depth {depth} in {path}")
+                try:
+                    obj, end = _decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                    obj = None
+                if obj is not None:
+                    yield obj
+                    pos = end
+                    continue
+
+            if eof:
+                if depth != 0:
+                    raise ValueError(f"Unterminated JSON array in {path}")
+                return
+            # Need more data: drop what was consumed and read the next block
+            data = f.read(read_size)
+            if not data:
+                eof = True
+            buffer = buffer[pos:] + data
+            pos = 0
+
+
+class JsonArrayWriter:
+    """Write a JSON array one object at a time without holding it in memory."""
+
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = open_artifact(path, 'wt')
+        self._file.write("[")
+
+    def write(self, obj):
+        self.write_encoded(json.dumps(obj, ensure_ascii=False))
+
+    def write_encoded(self, text):
+        """Append an object that is already JSON-encoded."""
+        self._file.write(",\n" if self.count else "\n")
+        self._file.write(text)
+        self.count += 1
+
+    def close(self):
+        self._file.write("\n]\n")
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
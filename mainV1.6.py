@@ -1,12 +1,41 @@
-import pandas as pd
+import csv
+import io
 import json
 import re
-import requests
 from datetime import datetime
 import time
 import os
-from tqdm import tqdm
 import sys
+import argparse
+import fnmatch
+import subprocess
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+# pandas/numpy are imported lazily by the stages that need them, so the
+# retry and health commands start without paying for them
+from brizo_schema import apply_schema, csv_read_options, excel_read_options, normalize_chunk
+from bar_sink import check_api, post_bar_with_reason, use_session_pool, with_failure_reason, FAILURE_REASON_KEY
+from resilient_sink import ResilientSink, FAILURE_THRESHOLD, RESET_SECONDS, SPOOLED
+from wire_encoding import BodyEncoder
+from compression import open_artifact, with_compression_suffix
+from mongo_export import (NdjsonShardWriter, encode_document, mongoimport_command, SHARD_ROWS,
+                          INDEXES_SCRIPT_NAME)
+from open_intervals import business_hours_to_intervals
+from hours_parser import parse_business_hours
+from external_sort import sort_bars_file, SORT_KEYS, MEMORY_BYTES
+from enrichment import Enricher
+from address import AddressParser, address_components
+from reconcile import reconcile, format_summary, PARTITIONS, DEFAULT_IGNORED_FIELDS
+from inbox_watch import InboxWatcher, JobStatus, SETTLE_SECONDS, POLL_SECONDS
+from preview import sample_rows, format_sample_stats, PREVIEW_ROWS, PER_STRATUM, SCAN_ROWS, STRATA_PATIENCE
+from field_mapping import compile_mapping, source_columns, null_free_rows
+from json_stream import iter_json_objects, JsonArrayWriter
+from csv_index import write_csv_with_index, build_csv_index, load_or_build_csv_index, read_csv_block, block_count
+from pipeline import Pipeline, Stage
+from distributed import (LeaseTable, LeaseHeartbeat, merge_range_outputs, default_worker_id, LEASE_DB_NAME,
+                         LEASE_SECONDS, RANGE_BLOCKS, PENDING, LEASED, DONE)
+from profiling import StageProfiler, DEFAULT_SAMPLE_RATE
 
 # === Config ===
 # Use relative paths instead of absolute paths for better portability
@@ -16,6 +45,26 @@ TEMP_CSV = os.path.join(SCRIPT_DIR, "content-folder/converted_temp9.csv")
 OUTPUT_JSON = os.path.join(SCRIPT_DIR, "content-folder/large_output9.json")
 API_URL = "http://localhost:3001/api/v1/bar/addBar"
 CHUNK_SIZE = 100  # reduced for testing
+COMPRESSION = None  # None, "gzip" or "zstd"; also picked up from a .gz/.zst path
+EXCLUDED_COUNTRIES = ("CA",)  # Country Code values never migrated
+
+# Pipeline parallelism: threads per stage and the bounded queue in front of each stage
+READ_WORKERS = 1
+TRANSFORM_WORKERS = 2
+POST_WORKERS = 8
+ENCODE_WORKERS = 2
+BODY_ENCODING = None  # None (requests' json=), "compact" or "gzip" (compact, gzipped when the API takes it)
+QUEUE_SIZE = 4
+
+# Watch mode: workbooks/CSV shards dropped into INBOX_DIR are processed by warm worker processes
+INBOX_DIR = os.path.join(SCRIPT_DIR, "content-folder/inbox")
+JOBS_DIR = os.path.join(SCRIPT_DIR, "content-folder/jobs")
+WATCH_JOBS = 2
+
+# Circuit breaker: bars are spooled here while the API is down and drained once it recovers
+SPOOL_PATH = os.path.join(SCRIPT_DIR, "content-folder/bar_spool.sqlite")
+BREAKER_FAILURES = FAILURE_THRESHOLD
+BREAKER_RESET_SECONDS = RESET_SECONDS
 
 # === Mappings ===
 DAY_MAP = {
@@ -40,8 +89,8 @@ def normalize_time(raw_time):
     try:
         dt = datetime.strptime(raw_time, "%I:%M%p")
         return dt.strftime("%H:%M")
-    except Exception as e:
-        print(f"Warning: Could not parse time '{raw_time}': {str(e)}")
+    except ValueError:
+        # Unparseable hours are counted by the validation stage
         return None
 
 def expand_days_range(start, end):
@@ -49,14 +98,15 @@ def expand_days_range(start, end):
     try:
         start_idx = keys.index(start)
         end_idx = keys.index(end)
-    except Exception as e:
-        print(f"Warning: Invalid day range {start}-{end}: {str(e)}")
+    except ValueError:
         return []
     if start_idx <= end_idx:
         return [DAY_MAP[k] for k in keys[start_idx:end_idx+1]]
     return [DAY_MAP[k] for k in (keys[start_idx:] + keys[:end_idx+1])]
 
 def convert_opening_hours_to_business_hours(hours_str):
+    # The V1.6 regex/strptime parser; bars now use hours_parser.parse_business_hours,
+    # and this stays as the reference for benchmarks/fuzz_hours_parser.py
     if not isinstance(hours_str, str):
         return [{"day": day, "is_closed": True} for day in WEEK_DAYS]
     business_hours = {day: {"day": day, "is_closed": True} for day in WEEK_DAYS}
@@ -79,7 +129,7 @@ def convert_opening_hours_to_business_hours(hours_str):
 def transform_row(row_dict):
     name = row_dict.get("Name", "")
     if not name:
-        print("Warning: Row missing name, skipping")
+        # Rows without a name are quarantined by the validation stage
         return None
         
     email = row_dict.get("Most Common Email") or row_dict.get("Direct Emails") or None
@@ -88,21 +138,9 @@ def transform_row(row_dict):
     slug = name.lower().replace(" ", "-").replace("'", "")
     
     # Check required coordinates
-    lon = row_dict.get("Establishment Longitude")
-    lat = row_dict.get("Establishment Latitude")
-    if not lon or not lat:
-        print(f"Warning: Missing coordinates for {name}, using null")
-        location = None
-    else:
-        try:
-            location = {
-                "type": "Point",
-                "coordinates": [float(lon), float(lat)]
-            }
-        except (ValueError, TypeError) as e:
-            print(f"Warning: Invalid coordinates for {name}: {e}")
-            location = None
-    
+    location = _point(row_dict.get("Establishment Longitude"), row_dict.get("Establishment Latitude"))
+
+    business_hours = parse_business_hours(row_dict.get("Opening Hours", ""))
     return {
         "sic_code": row_dict.get("SIC Code") or None,
         "name": name,
@@ -116,7 +154,9 @@ def transform_row(row_dict):
         "phone": row_dict.get("Phone", ""),
         "email": email,
         "website": row_dict.get("URL", ""),
-        "business_hours": convert_opening_hours_to_business_hours(row_dict.get("Opening Hours", "")),
+        "business_hours": business_hours,
+        # Sorted [start, end) minutes from Monday 00:00 for "open now" queries
+        "open_intervals": business_hours_to_intervals(business_hours),
         "google_place_id": None,
         "google_reference": None,
         "available_in_angel_shot": False,
@@ -125,22 +165,81 @@ def transform_row(row_dict):
         "is_deleted": False
     }
 
-def post_bar(bar_object):
+# === Field mapping ===
+# The same Brizo -> bar mapping as transform_row, as a spec that
+# compile_mapping turns into a row-tuple transformer for the pipeline.
+# transform_row stays as the readable reference (and benchmark baseline).
+
+def _slug(name):
+    return name.lower().replace(" ", "-").replace("'", "")
+
+def _first_email(most_common, direct):
+    email = most_common or direct or None
+    if email and isinstance(email, str) and "," in email:
+        email = email.split(",")[0].strip()
+    return email
+
+def _point(lon, lat):
+    if not lon or not lat:
+        return None
     try:
-        print(f"Posting bar: {bar_object['name']}")
-        response = requests.post(API_URL, json=bar_object, timeout=10)
-        if response.status_code == 201:
-            print(f"Success: {bar_object['name']} posted")
-            return True
-        else:
-            print(f"⚠️ API Error: {response.status_code} - {response.text}")
-            return False
-    except requests.exceptions.ConnectionError:
-        print(f"⚠️ Connection error: Could not connect to API at {API_URL}")
-        return False
-    except Exception as e:
-        print(f"⚠️ Request failed: {str(e)}")
-        return False
+        lon, lat = float(lon), float(lat)
+    except (ValueError, TypeError):
+        return None
+    # Out-of-range (or NaN) coordinates would break the 2dsphere index; validation counts them
+    if not (-180 <= lon <= 180 and -90 <= lat <= 90):
+        return None
+    return {"type": "Point", "coordinates": [lon, lat]}
+
+def _country_code(value):
+    return COUNTRY_CODE_MAP.get(str(value).strip(), "+1")
+
+def _is_open(status):
+    return str(status).lower() == "open"
+
+BAR_DERIVATIONS = {
+    "slug": _slug,
+    "first_email": _first_email,
+    "point": _point,
+    "country_code": _country_code,
+    "is_open": _is_open,
+    "business_hours": parse_business_hours,
+    "open_intervals": business_hours_to_intervals,
+    "address_components": address_components,
+}
+
+BAR_FIELD_SPEC = [
+    {"field": "sic_code", "source": "SIC Code", "coerce": "or_none"},
+    {"field": "name", "source": "Name", "default": "", "required": True},
+    {"field": "google_registerd_bar_name", "from": "name"},
+    {"field": "description", "source": "Description", "coerce": "or_none"},
+    {"field": "slug", "from": "name", "derive": "slug"},
+    {"field": "address", "source": "Full Address", "default": ""},
+    {"field": "location", "source": ["Establishment Longitude", "Establishment Latitude"], "derive": "point"},
+    {"field": "images", "const": []},
+    {"field": "country_code", "source": "Country Code", "default": "", "derive": "country_code"},
+    {"field": "phone", "source": "Phone", "default": ""},
+    {"field": "email", "source": ["Most Common Email", "Direct Emails"], "derive": "first_email"},
+    {"field": "website", "source": "URL", "default": ""},
+    {"field": "business_hours", "source": "Opening Hours", "default": "", "derive": "business_hours"},
+    # Sorted [start, end) minutes from Monday 00:00 for "open now" queries
+    {"field": "open_intervals", "from": "business_hours", "derive": "open_intervals"},
+    {"field": "google_place_id", "const": None},
+    {"field": "google_reference", "const": None},
+    {"field": "available_in_angel_shot", "const": False},
+    {"field": "owner_id", "const": None},
+    {"field": "is_active", "source": "Status", "default": "", "derive": "is_open"},
+    {"field": "is_deleted", "const": False},
+]
+
+def compile_bar_transform(columns):
+    """Compiled BAR_FIELD_SPEC for rows holding `columns` (in that order)."""
+    return compile_mapping(BAR_FIELD_SPEC, columns, BAR_DERIVATIONS)
+
+def save_json(path, data):
+    # Compressed paths (.gz/.zst) are compressed on a background writer thread
+    with open_artifact(path, 'wt') as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
 
 # === Steps ===
 
@@ -154,9 +253,11 @@ def convert_excel_to_csv(input_path, output_csv_path):
     if not os.path.exists(input_path):
         raise FileNotFoundError(f"❌ Input Excel file not found: {input_path}")
         
+    import pandas as pd
+
     print(f"Reading Excel file: {input_path}")
     try:
-        df = pd.read_excel(input_path, engine='openpyxl')
+        df = pd.read_excel(input_path, **excel_read_options())
     except Exception as e:
         raise Exception(f"Failed to read Excel file: {str(e)}")
         
@@ -171,12 +272,16 @@ def convert_excel_to_csv(input_path, output_csv_path):
 
     if 'Country Code' in df.columns:
         before_count = len(df)
-        df = df[~df['Country Code'].astype(str).str.strip().str.upper().eq('CA')]
+        df = df[~df['Country Code'].astype(str).str.strip().str.upper().isin(EXCLUDED_COUNTRIES)]
         after_count = len(df)
         print(f"✅ {before_count - after_count} Canada rows removed. Remaining: {after_count} rows.")
 
+    # Pin column types so every chunk of the CSV reads back the same way
+    df = apply_schema(df)
+
     print(f"Writing CSV to: {output_csv_path}")
-    df.to_csv(output_csv_path, index=False)
+    index = write_csv_with_index(df, output_csv_path, every=CHUNK_SIZE)
+    print(f"✅ CSV index written: {index['row_count']} rows in {block_count(index)} chunks")
     
     # Verify the CSV was created
     if os.path.exists(output_csv_path):
@@ -184,62 +289,200 @@ def convert_excel_to_csv(input_path, output_csv_path):
     else:
         raise FileNotFoundError(f"❌ Failed to create CSV at: {output_csv_path}")
 
-def process_csv_and_post(csv_path, output_json_path):
+def filter_csv_shard(input_path, output_csv_path):
+    """Copy a CSV shard (plain, .gz or .zst) to a plain indexed CSV without the rows convert_excel_to_csv drops."""
+    print(f"Filtering CSV shard: {input_path}")
+    removed = kept = 0
+    with open_artifact(input_path, 'rb') as raw, \
+            io.TextIOWrapper(raw, encoding='utf-8', newline='') as source, \
+            open(output_csv_path, 'w', encoding='utf-8', newline='') as target:
+        rows = csv.reader(source)
+        writer = csv.writer(target, lineterminator='\n')
+        header = next(rows, [])
+        writer.writerow(header)
+        country = header.index('Country Code') if 'Country Code' in header else None
+        for row in rows:
+            if country is not None and country < len(row) and row[country].strip().upper() in EXCLUDED_COUNTRIES:
+                removed += 1
+                continue
+            writer.writerow(row)
+            kept += 1
+    print(f"✅ {removed} Canada rows removed. Remaining: {kept} rows.")
+    index = build_csv_index(output_csv_path, every=CHUNK_SIZE)
+    print(f"✅ CSV index written: {index['row_count']} rows in {block_count(index)} chunks")
+
+def make_chunk_transform(columns, validation_summary, quarantine, enricher=None, addresses=None):
+    """Validate, quarantine, enrich, parse addresses and transform one DataFrame chunk into a list of bars."""
+    from validation import validate_chunk, split_valid
+
+    # Only the columns the mapping reads are turned into row tuples
+    enriched = enricher.field_spec(columns) if enricher else []
+    enriched += addresses.field_spec(columns) if addresses else []
+    spec = BAR_FIELD_SPEC + enriched
+    available = set(columns) | set(source_columns(enriched))
+    mapped_columns = [c for c in source_columns(spec) if c in available]
+    transform = compile_mapping(spec, mapped_columns, BAR_DERIVATIONS)
+
+    def transform_chunk(chunk):
+        masks = validate_chunk(chunk)
+        validation_summary.add(masks)
+        chunk, rejected, rejected_masks = split_valid(chunk, masks)
+        quarantine.write(rejected, rejected_masks)
+        if enricher:
+            chunk = enricher.enrich(chunk)
+        if addresses:
+            chunk = addresses.parse(chunk)
+
+        bars = []
+        for row in null_free_rows(chunk[mapped_columns]):
+            bar_object = transform(row)
+            if bar_object is not None:
+                bars.append(bar_object)
+        return bars
+
+    return transform_chunk
+
+def make_transform_stages(csv_path, index, validation_summary, quarantine, profiler=None, enricher=None,
+                          addresses=None):
+    """Read and validate/transform stages shared by every command that turns the CSV into bars."""
+    read_options = csv_read_options(index["columns"])
+    transform_chunk = make_chunk_transform(index["columns"], validation_summary, quarantine, enricher, addresses)
+
+    def read_stage(block_no):
+        try:
+            chunk = read_csv_block(csv_path, index, block_no, **read_options)
+        except (ValueError, TypeError):
+            # Non-numeric coordinates in an older CSV: read them as text and let validation flag them
+            chunk = read_csv_block(csv_path, index, block_no, **csv_read_options(index["columns"], strict=False))
+        return block_no, normalize_chunk(chunk)
+
+    def transform_stage(item):
+        block_no, chunk = item
+        return block_no, transform_chunk(chunk)
+
+    if profiler:
+        read_stage = profiler.wrap("read", read_stage)
+        transform_stage = profiler.wrap("transform", transform_stage)
+
+    return [
+        Stage("read", read_stage, workers=READ_WORKERS, queue_size=QUEUE_SIZE),
+        Stage("transform", transform_stage, workers=TRANSFORM_WORKERS, queue_size=QUEUE_SIZE),
+    ]
+
+def make_encode_stage(encoder, profiler=None):
+    """Stage encoding each block's bars into request bodies ahead of the posting threads."""
+    def encode_stage(item):
+        block_no, bars = item
+        return block_no, bars, [encoder.encode(bar_object) for bar_object in bars]
+
+    if profiler:
+        encode_stage = profiler.wrap("encode", encode_stage)
+    return Stage("encode", encode_stage, workers=ENCODE_WORKERS, queue_size=QUEUE_SIZE)
+
+def make_post_stage(api_url, api_accessible, profiler=None, sink=None, encoder=None, stop=None):
+    """Stage posting each block's bars; with a ResilientSink `sink`, spooled bars are in neither list.
+
+    With a BodyEncoder `encoder` the stage expects `(block_no, bars, bodies)` from make_encode_stage.
+    Once the `stop` event is set the remaining bars are neither posted nor listed.
+    """
+    send = sink.post if sink else (lambda bar_object, body: post_bar_with_reason(bar_object, api_url, body))
+    post = (lambda bar_object, body: encoder.post(send, bar_object, body)) if encoder else send
+
+    def post_stage(item):
+        block_no, bars = item[0], item[1]
+        if not api_accessible:
+            # Skip API posting but collect all objects
+            return block_no, bars, []
+        bodies = item[2] if encoder else [None] * len(bars)
+        posted, failed = [], []
+        for bar_object, body in zip(bars, bodies):
+            if stop is not None and stop.is_set():
+                break
+            ok, reason = post(bar_object, body)
+            if ok:
+                posted.append(bar_object)
+            elif reason != SPOOLED:
+                failed.append(with_failure_reason(bar_object, reason))
+        return block_no, posted, failed
+
+    if profiler:
+        post_stage = profiler.wrap("post", post_stage)
+    return Stage("post", post_stage, workers=POST_WORKERS, queue_size=QUEUE_SIZE)
+
+def report_enrichment(enricher, report_path):
+    print(enricher.format())
+    report = enricher.report()
+    if any(table["unmatched"] for table in report.values()):
+        save_json(report_path, report)
+        print(f"⚠️ Unmatched reference codes saved: {report_path}")
+
+def report_addresses(addresses, report_path):
+    print(addresses.format())
+    report = addresses.report()
+    if any(report["issues"].values()):
+        save_json(report_path, report)
+        print(f"⚠️ Address issues saved: {report_path}")
+
+def _record_drained(sink, successful_bars, failed_bars):
+    for bar_object, ok, reason in sink.take_drained():
+        if ok:
+            successful_bars.append(bar_object)
+        else:
+            failed_bars.append(with_failure_reason(bar_object, reason))
+
+def process_csv_and_post(csv_path, output_json_path, profiler=None, api_url=API_URL, spool_path=SPOOL_PATH,
+                         body_encoding=BODY_ENCODING):
+    from validation import ValidationSummary, QuarantineWriter
+
     if not os.path.exists(csv_path):
         raise FileNotFoundError(f"❌ CSV file not found: {csv_path}")
 
-    # Count rows for progress reporting
-    with open(csv_path, 'r') as f:
-        row_count = sum(1 for _ in f) - 1  # Subtract header row
+    # Row count and chunk offsets come from the sidecar index written with the CSV
+    index = load_or_build_csv_index(csv_path, every=CHUNK_SIZE)
+    row_count = index["row_count"]
     print(f"ℹ️ Total CSV rows: {row_count}")
 
     successful_bars = []
     failed_bars = []
     
-    api_accessible = False
-    try:
-        # Test the API connection before we start
-        response = requests.get(API_URL.rsplit('/', 1)[0], timeout=5)
-        if response.status_code < 500:  # Any response that's not a server error
-            api_accessible = True
-            print("✅ API appears to be accessible")
-        else:
-            print(f"⚠️ API returned status code {response.status_code}")
-    except requests.exceptions.RequestException:
-        print(f"⚠️ Could not connect to API at {API_URL}")
-    
+    # Test the API connection before we start
+    api_accessible = check_api(api_url)
     if not api_accessible:
         print("⚠️ Continuing without API (will save to JSON only)")
     
     chunk_count = 0
-    total_chunks = (row_count + CHUNK_SIZE - 1) // CHUNK_SIZE  # Ceiling division
-    
+    total_chunks = block_count(index)
+    validation_summary = ValidationSummary()
+    quarantine = QuarantineWriter(output_json_path.replace(".json", "_quarantine.ndjson"))
+    enricher = Enricher()
+    addresses = AddressParser()
+
+    sink = None
+    if api_accessible and spool_path:
+        sink = ResilientSink(api_url, spool_path, BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+        if len(sink.spool):
+            print(f"ℹ️ {len(sink.spool)} bars left in the spool by an earlier run will be drained")
+
+    encoder = BodyEncoder(use_gzip=body_encoding == "gzip") if api_accessible and body_encoding else None
+
+    stages = make_transform_stages(csv_path, index, validation_summary, quarantine, profiler, enricher, addresses)
+    if encoder:
+        stages.append(make_encode_stage(encoder, profiler))
+    stages.append(make_post_stage(api_url, api_accessible, profiler, sink, encoder))
+    pipeline = Pipeline(range(total_chunks), stages, output_queue_size=QUEUE_SIZE)
+
     try:
-        for chunk in pd.read_csv(csv_path, chunksize=CHUNK_SIZE):
+        for block_no, posted, failed in pipeline.run():
             chunk_count += 1
-            print(f"\nProcessing chunk {chunk_count}/{total_chunks}")
-            
-            for _, row in chunk.iterrows():
-                row_dict = row.where(pd.notnull(row), None).to_dict()
-                bar_object = transform_row(row_dict)
-                
-                if bar_object is None:
-                    continue
-                
-                if api_accessible:
-                    posted = post_bar(bar_object)
-                    if posted:
-                        successful_bars.append(bar_object)
-                    else:
-                        failed_bars.append(bar_object)
-                else:
-                    # Skip API posting but collect all objects
-                    successful_bars.append(bar_object)
-                    
+            successful_bars.extend(posted)
+            failed_bars.extend(failed)
+            if sink:
+                _record_drained(sink, successful_bars, failed_bars)
+            print(f"\nProcessed chunk {block_no + 1} ({chunk_count}/{total_chunks})")
+
             # Save progress after each chunk
             intermediate_json = output_json_path.replace(".json", f"_partial_{chunk_count}.json")
-            with open(intermediate_json, 'w', encoding='utf-8') as f:
-                json.dump(successful_bars, f, ensure_ascii=False, indent=2)
+            save_json(intermediate_json, successful_bars)
             print(f"✅ Intermediate JSON saved: {intermediate_json}")
     
     except Exception as e:
@@ -247,35 +490,704 @@ def process_csv_and_post(csv_path, output_json_path):
         # Save what we have so far
         if successful_bars:
             recovery_json = output_json_path.replace(".json", "_recovery.json")
-            with open(recovery_json, 'w', encoding='utf-8') as f:
-                json.dump(successful_bars, f, ensure_ascii=False, indent=2)
+            save_json(recovery_json, successful_bars)
             print(f"✅ Recovery JSON saved: {recovery_json}")
         raise
+    finally:
+        quarantine.close()
+        if sink:
+            spooled = sink.close()
+            _record_drained(sink, successful_bars, failed_bars)
+
+    print(pipeline.format_metrics())
+    if encoder:
+        print(encoder.format())
+    print(validation_summary.format())
+    if quarantine.rows:
+        print(f"⚠️ Quarantined rows saved: {quarantine.path} ({quarantine.rows} rows)")
+    report_enrichment(enricher, output_json_path.replace(".json", "_unmatched_codes.json"))
+    report_addresses(addresses, output_json_path.replace(".json", "_address_issues.json"))
+    if sink and (sink.spooled or sink.drained):
+        print(f"🔌 Circuit breaker: opened {sink.breaker.trips} times, {sink.spooled} bars spooled, "
+              f"{sink.drained} drained")
+    if sink and spooled:
+        print(f"⚠️ {spooled} bars still spooled in {spool_path}; run the drain command once the API is up")
 
     # Save final JSONs
-    with open(output_json_path, 'w', encoding='utf-8') as f:
-        json.dump(successful_bars, f, ensure_ascii=False, indent=2)
+    save_json(output_json_path, successful_bars)
     print(f"✅ JSON saved: {output_json_path} ({len(successful_bars)} bars)")
 
     if failed_bars:
         failed_json_path = output_json_path.replace(".json", "_failed.json")
-        with open(failed_json_path, 'w', encoding='utf-8') as f:
-            json.dump(failed_bars, f, ensure_ascii=False, indent=2)
+        save_json(failed_json_path, failed_bars)
         print(f"⚠️ Failed bars saved: {failed_json_path} ({len(failed_bars)} bars)")
 
-# === Main execution ===
+def export_csv_to_ndjson(csv_path, output_dir, shard_rows=SHARD_ROWS, compression=None, profiler=None):
+    """Transform the CSV into mongoimport-ready NDJSON shards instead of posting to the API."""
+    from validation import ValidationSummary, QuarantineWriter
 
-if __name__ == "__main__":
+    if not os.path.exists(csv_path):
+        raise FileNotFoundError(f"❌ CSV file not found: {csv_path}")
+    index = load_or_build_csv_index(csv_path, every=CHUNK_SIZE)
+    print(f"ℹ️ Total CSV rows: {index['row_count']}")
+
+    validation_summary = ValidationSummary()
+    quarantine = QuarantineWriter(os.path.join(output_dir, "quarantine.ndjson"))
+    enricher = Enricher()
+    addresses = AddressParser()
+
+    def encode_stage(item):
+        block_no, bars = item
+        lines = [encode_document(bar_object) for bar_object in bars]
+        return block_no, lines, [bar_object.get("slug") for bar_object in bars]
+
+    if profiler:
+        encode_stage = profiler.wrap("encode", encode_stage)
+
+    stages = make_transform_stages(csv_path, index, validation_summary, quarantine, profiler, enricher, addresses)
+    stages.append(Stage("encode", encode_stage, workers=TRANSFORM_WORKERS, queue_size=QUEUE_SIZE))
+    pipeline = Pipeline(range(block_count(index)), stages, output_queue_size=QUEUE_SIZE)
+
+    try:
+        with NdjsonShardWriter(output_dir, shard_rows=shard_rows, compression=compression) as writer:
+            # Blocks finish out of order; write them in file order so the same bar is the one
+            # kept for a repeated slug on every run
+            finished = {}
+            next_block = 0
+            for block_no, lines, slugs in pipeline.run():
+                finished[block_no] = (lines, slugs)
+                while next_block in finished:
+                    writer.write_lines(*finished.pop(next_block))
+                    next_block += 1
+            for block_no in sorted(finished):
+                writer.write_lines(*finished[block_no])
+    finally:
+        quarantine.close()
+
+    print(pipeline.format_metrics())
+    print(validation_summary.format())
+    if quarantine.rows:
+        print(f"⚠️ Quarantined rows saved: {quarantine.path} ({quarantine.rows} rows)")
+    report_enrichment(enricher, os.path.join(output_dir, "unmatched_codes.json"))
+    report_addresses(addresses, os.path.join(output_dir, "address_issues.json"))
+    print(f"✅ Exported {writer.total_rows} bars in {len(writer.shards)} shards to: {output_dir}")
+    if writer.duplicates:
+        print(f"⚠️ {sum(writer.duplicates.values())} bars repeat one of {len(writer.duplicates)} slugs already "
+              f"exported; they are held back from the shards so the unique slug index builds: "
+              f"{writer.duplicates_path}")
+    print("ℹ️ Import each shard in parallel, then create indexes:")
+    for shard in writer.shards:
+        print(f"   {mongoimport_command(os.path.join(output_dir, shard['file']), compression)}")
+    print(f"   mongosh \"$MONGO_URI\" {os.path.join(output_dir, INDEXES_SCRIPT_NAME)}")
+
+def run_distributed_worker(work_dir, worker_id, api_url=API_URL, lease_seconds=LEASE_SECONDS, partition=None):
+    """Claim block ranges from the lease table in `work_dir` and post them until none are left."""
+    from validation import ValidationSummary, QuarantineWriter
+
+    table = LeaseTable(os.path.join(work_dir, LEASE_DB_NAME))
+    csv_path = table.meta("csv_path")
+    index = load_or_build_csv_index(csv_path, every=CHUNK_SIZE)
+    api_accessible = check_api(api_url)
+    if not api_accessible:
+        print("⚠️ Continuing without API (will save to JSON only)")
+
+    validation_summary = ValidationSummary()
+    quarantine = QuarantineWriter(os.path.join(work_dir, f"quarantine.{worker_id}.ndjson"))
+    enricher = Enricher()
+    addresses = AddressParser()
+    ranges_done = 0
     try:
+        while True:
+            lease = table.claim(worker_id, lease_seconds, partition)
+            if lease is None:
+                if not table.status()[LEASED]:
+                    break
+                # Other workers still hold leases; wait in case one of them dies and its lease expires
+                time.sleep(min(lease_seconds / 3, 5))
+                continue
+
+            range_id = lease["range_id"]
+            print(f"ℹ️ [{worker_id}] Leased range {range_id} "
+                  f"(blocks {lease['start_block']}-{lease['stop_block'] - 1})")
+            stages = make_transform_stages(csv_path, index, validation_summary, quarantine, enricher=enricher,
+                                           addresses=addresses)
+            # A reclaimed lease stops posting at once: the new owner posts the whole range again
+            heartbeat = LeaseHeartbeat(table, worker_id, range_id, lease_seconds)
+            stages.append(make_post_stage(api_url, api_accessible, stop=heartbeat.lost))
+            pipeline = Pipeline(range(lease["start_block"], lease["stop_block"]), stages,
+                                output_queue_size=QUEUE_SIZE)
+            posted, failed = [], []
+            try:
+                with heartbeat:
+                    for _, range_posted, range_failed in pipeline.run():
+                        posted.extend(range_posted)
+                        failed.extend(range_failed)
+                        if heartbeat.lost.is_set():
+                            break
+            except Exception:
+                table.release(worker_id, range_id)
+                raise
+            if heartbeat.lost.is_set():
+                print(f"⚠️ [{worker_id}] Lease on range {range_id} expired and was reclaimed; stopped posting. "
+                      f"{len(posted)} of its bars were already posted and will be posted again by the new owner")
+                continue
+
+            # File names carry the worker id, so a reclaimed range never overwrites its earlier owner's files
+            output_json = f"range-{range_id:05d}.{worker_id}.json"
+            failed_json = f"range-{range_id:05d}.{worker_id}_failed.json" if failed else None
+            save_json(os.path.join(work_dir, output_json), posted)
+            if failed_json:
+                save_json(os.path.join(work_dir, failed_json), failed)
+            if table.complete(worker_id, range_id, output_json, failed_json, len(posted), len(failed)):
+                ranges_done += 1
+            else:
+                print(f"⚠️ [{worker_id}] Lost the lease on range {range_id} before completing it")
+    finally:
+        quarantine.close()
+        table.close()
+
+    print(validation_summary.format())
+    report_enrichment(enricher, os.path.join(work_dir, f"unmatched_codes.{worker_id}.json"))
+    report_addresses(addresses, os.path.join(work_dir, f"address_issues.{worker_id}.json"))
+    print(f"✅ [{worker_id}] Completed {ranges_done} ranges")
+    return ranges_done
+
+def sort_output(input_path, output_path, key, memory_bytes=MEMORY_BYTES, mode=None):
+    stats = sort_bars_file(input_path, output_path, key=key, memory_bytes=memory_bytes, mode=mode)
+    print(f"✅ Sorted {stats['records']} bars by {key} ({stats['runs']} spilled runs): {output_path}")
+    if mode == "dedup":
+        print(f"ℹ️ Dropped {stats['duplicates']} duplicate bars")
+    elif mode == "group":
+        print(f"ℹ️ Wrote {stats['groups']} groups")
+    return stats
+
+def merge_distributed_outputs(work_dir, output_json_path):
+    table = LeaseTable(os.path.join(work_dir, LEASE_DB_NAME))
+    try:
+        counts = table.status()
+        print(f"ℹ️ Ranges: {counts[DONE]} done, {counts[LEASED]} leased ({counts['expired']} expired), "
+              f"{counts[PENDING]} pending, {counts['reclaimed']} reclaimed after a lost lease")
+        failed_json_path = output_json_path.replace(".json", "_failed.json")
+        posted, failed = merge_range_outputs(table, work_dir, output_json_path, failed_json_path)
+    finally:
+        table.close()
+    print(f"✅ JSON saved: {output_json_path} ({posted} bars)")
+    if failed:
+        print(f"⚠️ Failed bars saved: {failed_json_path} ({failed} bars)")
+    return counts, failed
+
+def iter_csv_bars(csv_path, quarantine_path):
+    """Yield the bars a run would post for `csv_path` (same validation, enrichment, addresses and mapping)."""
+    from validation import ValidationSummary, QuarantineWriter
+
+    index = load_or_build_csv_index(csv_path, every=CHUNK_SIZE)
+    quarantine = QuarantineWriter(quarantine_path)
+    stages = make_transform_stages(csv_path, index, ValidationSummary(), quarantine, enricher=Enricher(),
+                                   addresses=AddressParser())
+    try:
+        for _, bars in Pipeline(range(block_count(index)), stages, output_queue_size=QUEUE_SIZE).run():
+            yield from bars
+    finally:
+        quarantine.close()
+
+def preview_workbook(input_path, output_json_path, size=PREVIEW_ROWS, per_stratum=None, scan_rows=SCAN_ROWS,
+                     patience=STRATA_PATIENCE, seed=None):
+    """Transform a sample of the workbook (or CSV) into bars without converting it or posting anything."""
+    import pandas as pd
+    from validation import ValidationSummary, QuarantineWriter
+
+    if not os.path.exists(input_path):
+        raise FileNotFoundError(f"❌ Input file not found: {input_path}")
+
+    # The same Canada rows convert_excel_to_csv drops are never sampled
+    columns, rows, stats = sample_rows(input_path, size=size, per_stratum=per_stratum, scan_rows=scan_rows,
+                                       patience=patience, exclude={"Country Code": EXCLUDED_COUNTRIES}, seed=seed)
+    print(format_sample_stats(input_path, stats))
+
+    validation_summary = ValidationSummary()
+    quarantine = QuarantineWriter(output_json_path.replace(".json", "_quarantine.ndjson"))
+    enricher = Enricher()
+    addresses = AddressParser()
+    # Through CSV text and back, as in a run, so NA spellings ("n/a", "NULL") and dtypes come out the same
+    text = apply_schema(pd.DataFrame(rows, columns=columns)).to_csv(index=False).encode("utf-8")
+    try:
+        chunk = pd.read_csv(io.BytesIO(text), **csv_read_options(columns))
+    except (ValueError, TypeError):
+        chunk = pd.read_csv(io.BytesIO(text), **csv_read_options(columns, strict=False))
+    chunk = normalize_chunk(chunk)
+    try:
+        bars = make_chunk_transform(columns, validation_summary, quarantine, enricher, addresses)(chunk)
+    finally:
+        quarantine.close()
+
+    print(validation_summary.format())
+    if quarantine.rows:
+        print(f"⚠️ Quarantined sample rows saved: {quarantine.path} ({quarantine.rows} rows)")
+    print(enricher.format())
+    print(addresses.format())
+    save_json(output_json_path, bars)
+    print(f"✅ Preview saved: {output_json_path} ({len(bars)} bars)")
+    return bars
+
+def _warm_watch_worker():
+    # Runs once per worker process: imports and parser setup are paid before the first job arrives
+    import pandas  # noqa: F401
+    import openpyxl  # noqa: F401
+    import validation  # noqa: F401
+    Enricher()
+    AddressParser()
+    # Posting threads are new for every job; the sessions, and their connections, outlive them
+    use_session_pool()
+    print(f"ℹ️ Worker {os.getpid()} ready")
+
+def run_inbox_job(status_path, input_path, job_dir, api_url=API_URL):
+    """Process one inbox file inside a watch worker; output and log go to `job_dir`."""
+    status = JobStatus.load(status_path)
+    status.started(pid=os.getpid())
+    error = None
+    with open(os.path.join(job_dir, "job.log"), 'w', encoding='utf-8') as log, contextlib.redirect_stdout(log):
+        try:
+            # CSV shards go through the same Canada filter as workbooks; compressed ones come out plain
+            csv_path = os.path.join(job_dir, "converted.csv")
+            if input_path.lower().endswith(".xlsx"):
+                convert_excel_to_csv(input_path, csv_path)
+            else:
+                filter_csv_shard(input_path, csv_path)
+            process_csv_and_post(csv_path, os.path.join(job_dir, "output.json"), api_url=api_url,
+                                 spool_path=os.path.join(job_dir, "spool.sqlite"))
+        except Exception as e:
+            import traceback
+            traceback.print_exc(file=log)
+            error = str(e)
+    outputs = sorted(name for name in os.listdir(job_dir) if name != os.path.basename(input_path))
+    status.finished(outputs={"dir": job_dir, "files": outputs}, error=error)
+    return error
+
+def _queue_inbox_file(path, jobs_dir):
+    name = os.path.basename(path)
+    job_id = datetime.now().strftime("%Y%m%d-%H%M%S-%f") + "-" + re.sub(r"[^A-Za-z0-9._-]", "_", name)
+    job_dir = os.path.join(jobs_dir, job_id)
+    os.makedirs(job_dir)
+    # Moving the file out of the inbox claims it; a sidecar CSV index goes along so it does not linger
+    input_path = os.path.join(job_dir, name)
+    os.replace(path, input_path)
+    if os.path.exists(path + ".idx.json"):
+        os.replace(path + ".idx.json", input_path + ".idx.json")
+    return JobStatus.create(jobs_dir, job_id, path, input=input_path, job_dir=job_dir), input_path, job_dir
+
+def watch_inbox(inbox_dir, jobs_dir, api_url=API_URL, max_jobs=WATCH_JOBS, settle_seconds=SETTLE_SECONDS,
+                poll_seconds=POLL_SECONDS, once=False):
+    """Process files dropped into `inbox_dir` until interrupted (or, with `once`, until it is empty)."""
+    os.makedirs(jobs_dir, exist_ok=True)
+    watcher = InboxWatcher(inbox_dir, settle_seconds)
+    # At most max_jobs run at once and as many again wait in the pool's queue; the rest stay in the inbox
+    max_pending = max_jobs * 2
+    pending = {}
+    finished = failed = 0
+    print(f"👀 Watching {inbox_dir} with {max_jobs} warm workers (status files in {jobs_dir})")
+    pool = ProcessPoolExecutor(max_workers=max_jobs, initializer=_warm_watch_worker)
+    try:
+        while True:
+            for future in [f for f in pending if f.done()]:
+                status = pending.pop(future)
+                try:
+                    error = future.result()
+                except Exception as e:
+                    # The worker process died; it could not record the failure itself
+                    error = str(e)
+                    JobStatus.load(status.path).finished(error=error)
+                finished += 1
+                if error:
+                    failed += 1
+                    print(f"❌ Job {status.data['job_id']} failed: {error}")
+                else:
+                    print(f"✅ Job {status.data['job_id']} done")
+
+            for path in watcher.ready_files()[:max(0, max_pending - len(pending))]:
+                watcher.forget(path)
+                status, input_path, job_dir = _queue_inbox_file(path, jobs_dir)
+                pending[pool.submit(run_inbox_job, status.path, input_path, job_dir, api_url)] = status
+                print(f"ℹ️ Queued {os.path.basename(path)} as job {status.data['job_id']}")
+
+            if once and not pending and not watcher.pending():
+                break
+            time.sleep(poll_seconds)
+    except KeyboardInterrupt:
+        print("ℹ️ Stopping: waiting for running jobs (queued jobs stay queued in their status files)")
+        for future in pending:
+            future.cancel()
+    finally:
+        pool.shutdown(wait=True)
+    print(f"🏁 {finished} jobs finished, {failed} failed")
+    return failed
+
+# === Commands ===
+
+def run_command(args):
+    temp_csv = with_compression_suffix(TEMP_CSV, args.compress)
+    output_json = with_compression_suffix(OUTPUT_JSON, args.compress)
+    profiler = StageProfiler(args.profile_dir, args.profile_rate) if args.profile else None
+
+    print("\n=== Step 1: Convert Excel to CSV ===")
+    if profiler:
+        profiler.wrap("excel_to_csv", convert_excel_to_csv, always=True)(INPUT_EXCEL, temp_csv)
+    else:
+        convert_excel_to_csv(INPUT_EXCEL, temp_csv)
+
+    print("\n=== Step 2: Process CSV and Post to API ===")
+    process_csv_and_post(temp_csv, output_json, profiler=profiler, api_url=args.api_url, spool_path=args.spool,
+                         body_encoding=args.body_encoding)
+
+    if profiler:
+        profiler.write_reports()
+        print(profiler.format_summary())
+
+    print("\n🏁 All Done Successfully!")
+
+def export_command(args):
+    csv_path = args.csv
+    if not csv_path:
+        csv_path = with_compression_suffix(TEMP_CSV, args.compress)
         print("\n=== Step 1: Convert Excel to CSV ===")
-        convert_excel_to_csv(INPUT_EXCEL, TEMP_CSV)
+        convert_excel_to_csv(INPUT_EXCEL, csv_path)
+
+    print("\n=== Step 2: Export NDJSON shards for mongoimport ===")
+    export_csv_to_ndjson(csv_path, args.output_dir, shard_rows=args.shard_rows,
+                         compression="gzip" if args.gzip else None)
+
+def distribute_command(args):
+    csv_path = args.csv
+    if not csv_path:
+        csv_path = with_compression_suffix(TEMP_CSV, args.compress)
+        print("\n=== Step 1: Convert Excel to CSV ===")
+        convert_excel_to_csv(INPUT_EXCEL, csv_path)
+
+    os.makedirs(args.work_dir, exist_ok=True)
+    index = load_or_build_csv_index(csv_path, every=CHUNK_SIZE)
+    partitions = args.partitions or max(1, args.local_workers)
+    table = LeaseTable(os.path.join(args.work_dir, LEASE_DB_NAME))
+    try:
+        # Workers on other hosts find the CSV through the shared filesystem, so store an absolute path
+        if table.plan(block_count(index), args.range_blocks, partitions, os.path.abspath(csv_path)):
+            print(f"✅ Planned {table.status()[PENDING]} ranges of {args.range_blocks} blocks "
+                  f"in {args.work_dir}")
+        else:
+            print(f"ℹ️ Resuming the existing lease table in {args.work_dir}")
+    finally:
+        table.close()
+
+    if not args.local_workers:
+        print("ℹ️ Start workers on each host, then merge:")
+        print(f"   python {os.path.basename(__file__)} worker --work-dir {args.work_dir}")
+        print(f"   python {os.path.basename(__file__)} merge --work-dir {args.work_dir}")
+        return 0
+
+    print(f"\n=== Step 2: Post with {args.local_workers} local worker processes ===")
+    workers = [
+        subprocess.Popen([sys.executable, os.path.abspath(__file__), "worker", "--work-dir", args.work_dir,
+                          "--api-url", args.api_url, "--partition", str(i % partitions),
+                          "--lease-seconds", str(args.lease_seconds)])
+        for i in range(args.local_workers)
+    ]
+    exit_codes = [worker.wait() for worker in workers]
+    if any(exit_codes):
+        print(f"⚠️ {sum(1 for code in exit_codes if code)} worker processes exited with an error")
+
+    print("\n=== Step 3: Merge worker outputs ===")
+    counts, failed = merge_distributed_outputs(args.work_dir, args.output)
+    return 1 if failed or any(exit_codes) or counts[PENDING] or counts[LEASED] else 0
 
-        print("\n=== Step 2: Process CSV and Post to API ===")
-        process_csv_and_post(TEMP_CSV, OUTPUT_JSON)
+def worker_command(args):
+    run_distributed_worker(args.work_dir, args.worker_id or default_worker_id(), api_url=args.api_url,
+                           lease_seconds=args.lease_seconds, partition=args.partition)
 
-        print("\n🏁 All Done Successfully!")
+def merge_command(args):
+    counts, failed = merge_distributed_outputs(args.work_dir, args.output)
+    if args.sort_by:
+        sort_output(args.output, args.output, args.sort_by, args.memory_mb * 1024 * 1024)
+    if counts[PENDING] or counts[LEASED]:
+        print("⚠️ Some ranges are not done yet; the merged output is partial")
+        return 1
+    return 1 if failed else 0
+
+def replay_bars(input_path, failed_json_path, api_url=API_URL, slugs=(), reasons=(), workers=POST_WORKERS):
+    """Stream bars from an output or failed-bars JSON file into the pooled posting sink.
+
+    `slugs` and `reasons` are glob patterns matched against each bar's slug and
+    recorded failure reason; a bar is replayed when it matches both filters.
+    """
+    def wanted(bar_object):
+        if slugs and not any(fnmatch.fnmatchcase(str(bar_object.get("slug", "")), p) for p in slugs):
+            return False
+        if reasons and not any(fnmatch.fnmatchcase(str(bar_object.get(FAILURE_REASON_KEY, "")), p)
+                               for p in reasons):
+            return False
+        return True
+
+    def post_stage(bar_object):
+        ok, reason = post_bar_with_reason(bar_object, api_url)
+        return bar_object, ok, reason
+
+    source = (bar_object for bar_object in iter_json_objects(input_path) if wanted(bar_object))
+    pipeline = Pipeline(source, [Stage("post", post_stage, workers=workers, queue_size=workers * 2)],
+                        output_queue_size=workers * 2)
+
+    posted = 0
+    failed_writer = None
+    try:
+        for bar_object, ok, reason in pipeline.run():
+            if ok:
+                posted += 1
+                continue
+            if failed_writer is None:
+                failed_writer = JsonArrayWriter(failed_json_path)
+            failed_writer.write(with_failure_reason(bar_object, reason))
+    finally:
+        if failed_writer is not None:
+            failed_writer.close()
+
+    print(pipeline.format_metrics())
+    print(f"✅ {posted} bars posted")
+    if failed_writer is not None:
+        print(f"⚠️ Still failing bars saved: {failed_json_path} ({failed_writer.count} bars)")
+        return posted, failed_writer.count
+    return posted, 0
+
+def _sibling_path(path, suffix):
+    # large_output9_failed.json(.gz) -> large_output9_failed<suffix>.json(.gz)
+    if ".json" in path:
+        return path.replace(".json", f"{suffix}.json")
+    return path + suffix + ".json"
+
+def replay_command(args):
+    if not check_api(args.api_url):
+        return 1
+    slugs = list(args.slug or [])
+    if args.slugs_file:
+        with open(args.slugs_file, 'r', encoding='utf-8') as f:
+            slugs.extend(line.strip() for line in f if line.strip())
+    failed_json_path = args.failed_output or _sibling_path(args.input_json, "_replay_failed")
+    print(f"ℹ️ Replaying bars from: {args.input_json}")
+    _, failed = replay_bars(args.input_json, failed_json_path, api_url=args.api_url, slugs=slugs,
+                            reasons=args.reason or [], workers=args.workers)
+    return 1 if failed else 0
+
+def retry_command(args):
+    if not check_api(args.api_url):
+        return 1
+    print(f"ℹ️ Retrying bars from: {args.failed_json}")
+    _, failed = replay_bars(args.failed_json, _sibling_path(args.failed_json, "_retry_failed"),
+                            api_url=args.api_url, workers=args.workers)
+    return 1 if failed else 0
+
+def drain_command(args):
+    if not os.path.exists(args.spool):
+        print(f"ℹ️ No spool at {args.spool}")
+        return 0
+    if not check_api(args.api_url):
+        return 1
+    sink = ResilientSink(args.api_url, args.spool, BREAKER_FAILURES, BREAKER_RESET_SECONDS)
+    print(f"ℹ️ Draining {len(sink.spool)} spooled bars from: {args.spool}")
+    remaining = sink.close()
+    posted, failed = [], []
+    _record_drained(sink, posted, failed)
+    print(f"✅ {len(posted)} bars posted")
+    if failed:
+        failed_json_path = args.failed_output or _sibling_path(OUTPUT_JSON, "_drain_failed")
+        save_json(failed_json_path, failed)
+        print(f"⚠️ Rejected bars saved: {failed_json_path} ({len(failed)} bars)")
+    if remaining:
+        print(f"⚠️ {remaining} bars are still spooled (the API went away again)")
+    return 1 if failed or remaining else 0
+
+def sort_command(args):
+    mode = "dedup" if args.dedup else "group" if args.group else None
+    sort_output(args.input_json, args.output or _sibling_path(args.input_json, "_sorted"), args.key,
+                args.memory_mb * 1024 * 1024, mode)
+
+def watch_command(args):
+    failed = watch_inbox(args.inbox, args.jobs_dir, api_url=args.api_url, max_jobs=args.jobs,
+                         settle_seconds=args.settle_seconds, poll_seconds=args.poll_seconds, once=args.once)
+    return 1 if failed else 0
+
+def verify_command(args):
+    csv_path = args.csv
+    if not csv_path:
+        csv_path = with_compression_suffix(TEMP_CSV, args.compress)
+        print("\n=== Step 1: Convert Excel to CSV ===")
+        convert_excel_to_csv(INPUT_EXCEL, csv_path)
+
+    print(f"\n=== Step 2: Reconcile {csv_path} with {args.target} ===")
+    source = iter_csv_bars(csv_path, args.report.replace(".json", "_quarantine.ndjson"))
+    summary = reconcile(source, iter_json_objects(args.target), args.report, key=args.key,
+                        partitions=args.partitions,
+                        ignored_fields=tuple(DEFAULT_IGNORED_FIELDS) + tuple(args.ignore_field or ()))
+    print(format_summary(summary))
+    print(f"✅ Report saved: {args.report}")
+    return 0 if summary["ok"] else 1
+
+def preview_command(args):
+    preview_workbook(args.input, args.output, size=args.rows, per_stratum=args.per_stratum if args.stratify else None,
+                     scan_rows=0 if args.full_scan else args.scan_rows, patience=args.patience, seed=args.seed)
+
+def health_command(args):
+    return 0 if check_api(args.api_url) else 1
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Migrate the Brizo workbook to the bar API")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="convert the workbook and post every bar (default)")
+    run.add_argument("--compress", choices=["gzip", "zstd"], default=COMPRESSION,
+                     help="compress the temp CSV and all JSON outputs")
+    run.add_argument("--profile", action="store_true",
+                     help="profile each stage with cProfile and tracemalloc")
+    run.add_argument("--profile-rate", type=float, default=DEFAULT_SAMPLE_RATE,
+                     help="fraction of chunks profiled per stage")
+    run.add_argument("--profile-dir", default=os.path.join(SCRIPT_DIR, "content-folder/profiles"),
+                     help="where pstats, collapsed stacks and allocation reports are written")
+    run.add_argument("--spool", default=SPOOL_PATH,
+                     help="SQLite spool for bars posted while the circuit breaker is open")
+    run.add_argument("--body-encoding", choices=["compact", "gzip"], default=BODY_ENCODING,
+                     help="pre-encode request bodies as compact JSON, gzipped unless the API answers 415")
+    run.set_defaults(handler=run_command)
+
+    retry = commands.add_parser("retry", help="re-post the bars of a failed-bars JSON file")
+    retry.add_argument("failed_json", help="e.g. content-folder/large_output9_failed.json")
+    retry.add_argument("--workers", type=int, default=POST_WORKERS, help="concurrent posting threads")
+    retry.set_defaults(handler=retry_command)
+
+    replay = commands.add_parser("replay", help="stream an output or failed JSON file back into the API")
+    replay.add_argument("input_json", help="flat or nested JSON array (or NDJSON), optionally .gz/.zst")
+    replay.add_argument("--slug", action="append", help="only replay slugs matching this glob (repeatable)")
+    replay.add_argument("--slugs-file", help="file with one slug or glob per line")
+    replay.add_argument("--reason", action="append",
+                        help="only replay bars whose failure reason matches this glob, e.g. 'http_5*'")
+    replay.add_argument("--failed-output", help="where bars that fail again are written")
+    replay.add_argument("--workers", type=int, default=POST_WORKERS, help="concurrent posting threads")
+    replay.set_defaults(handler=replay_command)
+
+    export = commands.add_parser("export", help="write mongoimport-ready NDJSON shards instead of posting")
+    export.add_argument("--csv", help="existing converted CSV (skips the Excel conversion)")
+    export.add_argument("--output-dir", default=os.path.join(SCRIPT_DIR, "content-folder/mongo_export"))
+    export.add_argument("--shard-rows", type=int, default=SHARD_ROWS, help="documents per NDJSON shard")
+    export.add_argument("--gzip", action="store_true", help="gzip the shards (mongoimport --gzip)")
+    export.add_argument("--compress", choices=["gzip", "zstd"], default=COMPRESSION,
+                        help="compress the temp CSV")
+    export.set_defaults(handler=export_command)
+
+    default_work_dir = os.path.join(SCRIPT_DIR, "content-folder/distributed")
+    distribute = commands.add_parser("distribute", help="plan a lease table so several workers can post the CSV")
+    distribute.add_argument("--csv", help="existing converted CSV (skips the Excel conversion)")
+    distribute.add_argument("--work-dir", default=default_work_dir,
+                            help="shared directory for the lease table and per-range outputs")
+    distribute.add_argument("--range-blocks", type=int, default=RANGE_BLOCKS,
+                            help=f"CSV blocks of {CHUNK_SIZE} rows per lease")
+    distribute.add_argument("--partitions", type=int,
+                            help="hash partitions of the ranges (default: one per local worker)")
+    distribute.add_argument("--local-workers", type=int, default=0,
+                            help="also start this many worker processes here and merge when they finish")
+    distribute.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS)
+    distribute.add_argument("--output", default=OUTPUT_JSON, help="merged output JSON")
+    distribute.add_argument("--compress", choices=["gzip", "zstd"], default=COMPRESSION,
+                            help="compress the temp CSV")
+    distribute.set_defaults(handler=distribute_command)
+
+    worker = commands.add_parser("worker", help="claim and post ranges from a distributed lease table")
+    worker.add_argument("--work-dir", default=default_work_dir)
+    worker.add_argument("--worker-id", help="unique id (default: hostname-pid)")
+    worker.add_argument("--partition", type=int, help="partition to claim first (default: hash of the id)")
+    worker.add_argument("--lease-seconds", type=float, default=LEASE_SECONDS,
+                        help="a lease not renewed for this long is reclaimed by another worker")
+    worker.set_defaults(handler=worker_command)
+
+    merge = commands.add_parser("merge", help="merge the per-range outputs of a distributed run")
+    merge.add_argument("--work-dir", default=default_work_dir)
+    merge.add_argument("--output", default=OUTPUT_JSON, help="merged output JSON")
+    merge.add_argument("--sort-by", choices=sorted(SORT_KEYS), help="sort the merged output by this key")
+    merge.add_argument("--memory-mb", type=int, default=MEMORY_BYTES // (1024 * 1024),
+                       help="memory budget of the sort; larger inputs spill sorted runs to disk")
+    merge.set_defaults(handler=merge_command)
+
+    sort = commands.add_parser("sort", help="sort an output JSON file by key with bounded memory")
+    sort.add_argument("input_json", help="flat or nested JSON array (or NDJSON), optionally .gz/.zst")
+    sort.add_argument("--output", help="sorted output (default: <input>_sorted.json); may be the input")
+    sort.add_argument("--key", choices=sorted(SORT_KEYS), default="slug",
+                      help="state_city orders by the state and city of the address, then slug")
+    sort.add_argument("--memory-mb", type=int, default=MEMORY_BYTES // (1024 * 1024),
+                      help="memory budget; larger inputs spill sorted runs to disk")
+    grouping = sort.add_mutually_exclusive_group()
+    grouping.add_argument("--dedup", action="store_true", help="keep only the first bar per key")
+    grouping.add_argument("--group", action="store_true",
+                          help="write one {key, count, bars} object per key (per state/city for state_city)")
+    sort.set_defaults(handler=sort_command)
+
+    drain = commands.add_parser("drain", help="post the bars left in the circuit-breaker spool")
+    drain.add_argument("--spool", default=SPOOL_PATH)
+    drain.add_argument("--failed-output", help="where bars the API rejects are written")
+    drain.set_defaults(handler=drain_command)
+
+    watch = commands.add_parser("watch", help="process workbooks and CSV shards dropped into an inbox directory")
+    watch.add_argument("--inbox", default=INBOX_DIR)
+    watch.add_argument("--jobs-dir", default=JOBS_DIR, help="per-job status files, logs and outputs")
+    watch.add_argument("--jobs", type=int, default=WATCH_JOBS, help="jobs processed at the same time")
+    watch.add_argument("--settle-seconds", type=float, default=SETTLE_SECONDS,
+                       help="a file is taken once its size and mtime are unchanged for this long")
+    watch.add_argument("--poll-seconds", type=float, default=POLL_SECONDS)
+    watch.add_argument("--once", action="store_true", help="exit once the inbox is empty and all jobs finished")
+    watch.set_defaults(handler=watch_command)
+
+    verify = commands.add_parser("verify", help="check that every source bar landed in the target exactly once")
+    verify.add_argument("target", help="target dump: NDJSON (mongoexport) or JSON array, optionally .gz/.zst")
+    verify.add_argument("--csv", help="existing converted CSV (skips the Excel conversion)")
+    verify.add_argument("--key", default="slug",
+                        help="field identifying a bar on both sides; bars sharing it are told apart by content")
+    verify.add_argument("--partitions", type=int, default=PARTITIONS,
+                        help="hash partitions; memory is bounded by one partition's keys")
+    verify.add_argument("--ignore-field", action="append",
+                        help=f"extra field left out of the content hash (always: {', '.join(DEFAULT_IGNORED_FIELDS)})")
+    verify.add_argument("--report", default=os.path.join(SCRIPT_DIR, "content-folder/reconcile_report.json"))
+    verify.add_argument("--compress", choices=["gzip", "zstd"], default=COMPRESSION,
+                        help="compress the temp CSV")
+    verify.set_defaults(handler=verify_command)
+
+    preview = commands.add_parser("preview", help="transform a sample of the workbook without posting anything")
+    preview.add_argument("input", nargs="?", default=INPUT_EXCEL, help="workbook (.xlsx) or converted CSV")
+    preview.add_argument("--rows", type=int, default=PREVIEW_ROWS, help="size of the uniform sample")
+    preview.add_argument("--stratify", action="store_true",
+                         help="sample every Country Code/Status combination instead of uniformly")
+    preview.add_argument("--per-stratum", type=int, default=PER_STRATUM, help="rows sampled per stratum")
+    preview.add_argument("--scan-rows", type=int, default=SCAN_ROWS,
+                         help="stop reading after this many rows and sample only those")
+    preview.add_argument("--full-scan", action="store_true",
+                         help="read the whole file, for a sample uniform over all of it (minutes for big workbooks)")
+    preview.add_argument("--patience", type=int, default=STRATA_PATIENCE,
+                         help="with --stratify, stop once every stratum is full and none is new for this many rows")
+    preview.add_argument("--seed", type=int, help="random seed, for a repeatable sample")
+    preview.add_argument("--output", default=os.path.join(SCRIPT_DIR, "content-folder/preview.json"))
+    preview.set_defaults(handler=preview_command)
+
+    health = commands.add_parser("health", help="check that the API is reachable")
+    health.set_defaults(handler=health_command)
+
+    for command in (run, retry, replay, distribute, worker, drain, watch, health):
+        command.add_argument("--api-url", default=API_URL, help="addBar endpoint")
+    return parser
+
+# === Main execution ===
+
+def main(argv):
+    # Keep `python mainV1.6.py [--options]` working as the full run
+    if not argv or (argv[0].startswith("-") and argv[0] not in ("-h", "--help")):
+        argv = ["run"] + argv
+    args = build_parser().parse_args(argv)
+    try:
+        return args.handler(args) or 0
     except Exception as e:
         print(f"❌ ERROR: {str(e)}")
         import traceback
         traceback.print_exc()
-        sys.exit(1)
\ No newline at end of file
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,185 @@
+import datetime
+import hashlib
+import itertools
+import json
+import math
+import os
+
+from compression import open_artifact
+
+# mongoimport-ready export.
+#
+# Bars are written as MongoDB Extended JSON (relaxed v2), one document per
+# line, into shards sized for `mongoimport --numInsertionWorkers`. Next to the
+# shards the exporter writes the index spec (indexes.json plus a mongosh
+# script) and a manifest with per-shard row counts, sizes and SHA-256 sums so
+# a loader can verify and import shards in parallel. Slugs come from names, so
+# chains repeat them, and the unique slug index cannot be built on a
+# collection holding repeats: only the first document with a slug goes into
+# the shards, later ones are held back in duplicate_slugs.ndjson, outside the
+# import commands, and counted in the manifest.
+
+COLLECTION = "bars"
+SHARD_PREFIX = "bars"
+SHARD_ROWS = 100_000
+MANIFEST_NAME = "manifest.json"
+INDEXES_NAME = "indexes.json"
+INDEXES_SCRIPT_NAME = "create_indexes.js"
+DUPLICATES_NAME = "duplicate_slugs.ndjson"
+INSERTION_WORKERS = 8
+
+UNIQUE_FIELD = "slug"
+INDEX_SPECS = [
+    {"key": {"location": "2dsphere"}, "name": "location_2dsphere"},
+    {"key": {UNIQUE_FIELD: 1}, "name": "slug_unique", "unique": True},
+]
+
+
+def to_extended_json(value):
+    """Convert values JSON cannot represent into their relaxed Extended JSON form."""
+    if isinstance(value, float):
+        if math.isnan(value):
+            return {"$numberDouble": "NaN"}
+        if math.isinf(value):
+            return {"$numberDouble": "Infinity" if value > 0 else "-Infinity"}
+        return value
+    if isinstance(value, dict):
+        return {k: to_extended_json(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_extended_json(v) for v in value]
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return {"$date": value.isoformat().replace("+00:00", "Z")}
+    return value
+
+
+def encode_document(doc):
+    return json.dumps(to_extended_json(doc), ensure_ascii=False, separators=(",", ":"),
+                      allow_nan=False) + "\n"
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def mongoimport_command(shard_file, compression=None):
+    command = (f'mongoimport --uri "$MONGO_URI" --collection {COLLECTION} --file {shard_file} '
+               f'--numInsertionWorkers {INSERTION_WORKERS}')
+    if compression == "gzip":
+        command += " --gzip"
+    return command
+
+
+class NdjsonShardWriter:
+    """Write pre-encoded NDJSON lines into fixed-size shards and describe them in a manifest."""
+
+    def __init__(self, output_dir, shard_rows=SHARD_ROWS, compression=None):
+        if compression not in (None, "gzip"):
+            raise ValueError("mongoimport only reads plain or gzip-compressed files")
+        self.output_dir = output_dir
+        self.shard_rows = shard_rows
+        self.compression = compression
+        self.shards = []
+        self.total_rows = 0
+        self.duplicates = {}  # slug -> documents held back because an earlier one has it
+        self._keys = set()  # hashes of the slugs seen; a set of 1M ints instead of 1M strings
+        self.duplicates_path = os.path.join(output_dir, DUPLICATES_NAME + (".gz" if compression else ""))
+        self._duplicates_file = None
+        self._file = None
+        self._path = None
+        self._rows = 0
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _open_shard(self):
+        name = f"{SHARD_PREFIX}-{len(self.shards):05d}.ndjson" + (".gz" if self.compression else "")
+        self._path = os.path.join(self.output_dir, name)
+        self._file = open_artifact(self._path, 'wt', compression=self.compression)
+        self._rows = 0
+
+    def _close_shard(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self.shards.append({
+            "file": os.path.basename(self._path),
+            "rows": self._rows,
+            "bytes": os.path.getsize(self._path),
+            "sha256": _sha256(self._path),
+        })
+        self._file = None
+
+    def _seen(self, key):
+        digest = hash(key)
+        if digest in self._keys:
+            return True
+        self._keys.add(digest)
+        return False
+
+    def _hold_back(self, key, line):
+        if self._duplicates_file is None:
+            self._duplicates_file = open_artifact(self.duplicates_path, 'wt', compression=self.compression)
+        self._duplicates_file.write(line)
+        self.duplicates[key] = self.duplicates.get(key, 0) + 1
+
+    def write_lines(self, lines, keys=None):
+        """Write encoded documents; `keys` are their slugs, and a repeated one is held back from the shards."""
+        for line, key in zip(lines, keys if keys is not None else itertools.repeat(None)):
+            if key is not None and self._seen(key):
+                self._hold_back(key, line)
+                continue
+            if self._file is None:
+                self._open_shard()
+            self._file.write(line)
+            self._rows += 1
+            self.total_rows += 1
+            if self._rows >= self.shard_rows:
+                self._close_shard()
+
+    def write(self, doc):
+        self.write_lines([encode_document(doc)], [doc.get(UNIQUE_FIELD)])
+
+    def close(self):
+        self._close_shard()
+        if self._duplicates_file is not None:
+            self._duplicates_file.close()
+        with open(os.path.join(self.output_dir, INDEXES_NAME), 'w', encoding='utf-8') as f:
+            json.dump({"collection": COLLECTION, "indexes": INDEX_SPECS}, f, indent=2)
+        with open(os.path.join(self.output_dir, INDEXES_SCRIPT_NAME), 'w', encoding='utf-8') as f:
+            f.write("// Run after the import: mongosh \"$MONGO_URI\" create_indexes.js\n")
+            f.write(f"db.getCollection({json.dumps(COLLECTION)}).createIndexes({json.dumps(INDEX_SPECS, indent=2)});\n")
+
+        manifest = {
+            "collection": COLLECTION,
+            "created_at": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "format": "ndjson-extended-json-relaxed",
+            "compression": self.compression,
+            "total_rows": self.total_rows,
+            "shards": self.shards,
+            "indexes": INDEXES_NAME,
+            "duplicate_slugs": {
+                "slugs": len(self.duplicates),
+                "rows": sum(self.duplicates.values()),
+                "file": os.path.basename(self.duplicates_path) if self.duplicates else None,
+            },
+            "import_commands": [mongoimport_command(s["file"], self.compression) for s in self.shards],
+        }
+        with open(os.path.join(self.output_dir, MANIFEST_NAME), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+        return manifest
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            # Never describe a half-written export in a manifest
+            self._close_shard()
+            if self._duplicates_file is not None:
+                self._duplicates_file.close()
+            return
+        self.close()
@@ -0,0 +1,102 @@
+import datetime
+
+# Minute-of-week open intervals.
+#
+# A bar's business hours become a sorted list of [start, end) minute offsets
+# from Monday 00:00, so "open now" is a range check instead of re-parsing
+# start_time/end_time strings. Overnight spans ("8pm-2am") run into the next
+# day, and Sunday-night spans wrap around to Monday morning.
+
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+DAY_INDEX = {
+    "Monday": 0, "Tuesday": 1, "Wednesday": 2, "Thursday": 3,
+    "Friday": 4, "Saturday": 5, "Sunday": 6,
+}
+
+
+def _minutes(hhmm):
+    hours, minutes = hhmm.split(":")
+    return int(hours) * 60 + int(minutes)
+
+
+def _merge(intervals):
+    intervals.sort()
+    merged = []
+    for start, end in intervals:
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def business_hours_to_intervals(business_hours):
+    """Convert per-day business hours into sorted, merged minute-of-week intervals."""
+    intervals = []
+    for entry in business_hours:
+        if entry.get("is_closed"):
+            continue
+        day_start = DAY_INDEX[entry["day"]] * MINUTES_PER_DAY
+        # Split shifts list every interval; otherwise the entry itself is the interval
+        for span in entry.get("intervals") or [entry]:
+            start = _minutes(span["start_time"])
+            end = _minutes(span["end_time"])
+            if end <= start:
+                # Closes after midnight (or equal times: open around the clock)
+                end += MINUTES_PER_DAY
+            start += day_start
+            end += day_start
+            if end > MINUTES_PER_WEEK:
+                intervals.append([start, MINUTES_PER_WEEK])
+                intervals.append([0, end - MINUTES_PER_WEEK])
+            else:
+                intervals.append([start, end])
+    return _merge(intervals)
+
+
+def minute_of_week(moment):
+    """Minute offset from Monday 00:00 for a datetime (in the bar's local time)."""
+    return moment.weekday() * MINUTES_PER_DAY + moment.hour * 60 + moment.minute
+
+
+class OpenIntervalIndex:
+    """Flat NumPy arrays over every bar's intervals for vectorized "open at T" queries."""
+
+    def __init__(self, keys, interval_lists):
+        import numpy as np
+
+        self.keys = list(keys)
+        counts = np.fromiter((len(intervals) for intervals in interval_lists), dtype=np.int64,
+                             count=len(self.keys))
+        owners = np.repeat(np.arange(len(self.keys), dtype=np.int32), counts)
+        flat = np.array([pair for intervals in interval_lists for pair in intervals],
+                        dtype=np.int16).reshape(-1, 2)
+        order = np.argsort(flat[:, 0], kind="stable")
+        self.starts = np.ascontiguousarray(flat[order, 0])
+        self.ends = np.ascontiguousarray(flat[order, 1])
+        self.owners = owners[order]
+
+    @classmethod
+    def from_bars(cls, bars, key="slug"):
+        bars = list(bars)
+        return cls((bar[key] for bar in bars), [bar.get("open_intervals") or [] for bar in bars])
+
+    def open_mask(self, minute):
+        """Boolean array over `keys`: True where the bar is open at `minute` of the week."""
+        import numpy as np
+
+        if isinstance(minute, datetime.datetime):
+            minute = minute_of_week(minute)
+        # Intervals are sorted by start, so only the prefix starting at or before `minute` can match
+        candidates = np.searchsorted(self.starts, minute, side="right")
+        hits = self.owners[:candidates][self.ends[:candidates] > minute]
+        mask = np.zeros(len(self.keys), dtype=bool)
+        mask[hits] = True
+        return mask
+
+    def open_at(self, minute):
+        """Keys of the bars open at `minute` (an int minute of week or a datetime)."""
+        import numpy as np
+
+        return [self.keys[i] for i in np.flatnonzero(self.open_mask(minute))]
@@ -0,0 +1,168 @@
+import queue
+import threading
+import time
+
+# Staged pipeline: a source feeds a chain of stages, each running `workers`
+# threads, connected by bounded queues. A slow stage fills its input queue and
+# blocks the stage in front of it (backpressure), so memory stays bounded and
+# end-to-end time tends towards the slowest stage instead of the sum of all.
+
+_END = object()
+
+
+class Stage:
+    def __init__(self, name, fn, workers=1, queue_size=4):
+        """`fn(item)` returns the item for the next stage; returning None drops it."""
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.processed = 0
+        self.busy_seconds = 0.0
+        self.depth_samples = 0
+        self.depth_total = 0
+        self.depth_max = 0
+        self._lock = threading.Lock()
+        self._finished_workers = 0
+
+    def _record(self, elapsed):
+        with self._lock:
+            self.processed += 1
+            self.busy_seconds += elapsed
+
+    def _sample_depth(self, depth):
+        self.depth_samples += 1
+        self.depth_total += depth
+        self.depth_max = max(self.depth_max, depth)
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "processed": self.processed,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "queue_depth_avg": round(self.depth_total / self.depth_samples, 2) if self.depth_samples else 0.0,
+            "queue_depth_max": self.depth_max,
+        }
+
+
+class Pipeline:
+    def __init__(self, source, stages, output_queue_size=4, sample_interval=0.2):
+        self.source = source
+        self.stages = stages
+        self.sample_interval = sample_interval
+        self.output_queue_size = output_queue_size
+        self.elapsed = 0.0
+        self._stop = threading.Event()
+        self._error = None
+        self._threads = []
+
+    def _fail(self, exc):
+        if self._error is None:
+            self._error = exc
+        self._stop.set()
+
+    def _put(self, q, item):
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _get(self, q):
+        while not self._stop.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _run_source(self, out_q, downstream_workers):
+        try:
+            for item in self.source:
+                if not self._put(out_q, item):
+                    return
+        except Exception as e:
+            self._fail(e)
+            return
+        for _ in range(downstream_workers):
+            self._put(out_q, _END)
+
+    def _run_worker(self, stage, in_q, out_q, downstream_workers):
+        while True:
+            item = self._get(in_q)
+            if item is _END:
+                break
+            start = time.perf_counter()
+            try:
+                result = stage.fn(item)
+            except Exception as e:
+                self._fail(e)
+                return
+            stage._record(time.perf_counter() - start)
+            if result is not None and not self._put(out_q, result):
+                return
+        # The last worker of a stage to finish forwards end-of-stream downstream
+        with stage._lock:
+            stage._finished_workers += 1
+            last = stage._finished_workers == stage.workers
+        if last:
+            for _ in range(downstream_workers):
+                self._put(out_q, _END)
+
+    def _run_monitor(self, queues):
+        while not self._stop.wait(self.sample_interval):
+            for stage, q in zip(self.stages, queues):
+                stage._sample_depth(q.qsize())
+
+    def _start(self, target, *args):
+        thread = threading.Thread(target=target, args=args, daemon=True)
+        thread.start()
+        self._threads.append(thread)
+
+    def run(self):
+        """Start all stages and yield the results of the last stage as they arrive."""
+        queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        output_q = queue.Queue(maxsize=self.output_queue_size)
+        downstream = queues[1:] + [output_q]
+        downstream_workers = [stage.workers for stage in self.stages[1:]] + [1]
+
+        start = time.perf_counter()
+        self._start(self._run_source, queues[0], self.stages[0].workers)
+        for stage, in_q, out_q, n_down in zip(self.stages, queues, downstream, downstream_workers):
+            for _ in range(stage.workers):
+                self._start(self._run_worker, stage, in_q, out_q, n_down)
+        monitor = threading.Thread(target=self._run_monitor, args=(queues,), daemon=True)
+        monitor.start()
+
+        try:
+            while True:
+                item = self._get(output_q)
+                if item is _END:
+                    break
+                yield item
+        finally:
+            self._stop.set()
+            for thread in self._threads:
+                thread.join()
+            monitor.join()
+            self.elapsed = time.perf_counter() - start
+
+        if self._error is not None:
+            raise self._error
+
+    def metrics(self):
+        return {stage.name: stage.metrics() for stage in self.stages}
+
+    def format_metrics(self):
+        lines = [f"📊 Pipeline finished in {self.elapsed:.2f}s"]
+        for stage in self.stages:
+            m = stage.metrics()
+            lines.append(
+                f"- {stage.name}: {m['processed']} items, {m['workers']} workers, "
+                f"busy {m['busy_seconds']:.2f}s, queue depth avg {m['queue_depth_avg']} "
+                f"max {m['queue_depth_max']}/{m['queue_size']}"
+            )
+        return "\n".join(lines)
@@ -0,0 +1,181 @@
+import contextlib
+import csv
+import math
+import os
+import random
+
+from compression import open_artifact
+
+# Sampled preview of a workbook or CSV.
+#
+# Rows are streamed (openpyxl read-only for .xlsx, csv for CSVs) and only a
+# sample is kept, so memory is bounded by the sample size and not by the
+# file. Two samplers:
+#
+#   Reservoir           a uniform sample of `size` rows. Algorithm L draws how
+#                       many rows to skip instead of a random number per row.
+#   StratifiedSample    a reservoir of `per_stratum` rows for every value of
+#                       the strata columns (Country Code/Status by default).
+#
+# Reading stops after `scan_rows` rows, so a preview of a 1M-row workbook
+# takes seconds; the sample then only covers the head of the file and the
+# stats say so. `scan_rows=0` reads the whole file for a sample that is
+# uniform over all of it (minutes for big workbooks). A stratified scan also
+# stops as soon as every stratum seen is full and no new one has shown up for
+# `patience` rows. The caller transforms and validates only the sampled rows.
+
+PREVIEW_ROWS = 50
+PER_STRATUM = 5
+STRATA_COLUMNS = ("Country Code", "Status")
+SCAN_ROWS = 20_000  # openpyxl streams ~7k rows/s; 0 reads the whole file
+STRATA_PATIENCE = 10_000
+PROGRESS_EVERY = 100_000
+
+
+def _open_uniform(rng):
+    # Uniform on (0, 1): Algorithm L takes logs of it and of 1 - w
+    while True:
+        u = rng.random()
+        if u > 0.0:
+            return u
+
+
+class Reservoir:
+    """Uniform sample of `size` items from a stream of unknown length."""
+
+    def __init__(self, size, rng=None):
+        self.size = size
+        self.items = []
+        self.seen = 0
+        self._rng = rng or random.Random()
+        self._w = 1.0
+        self._next = None
+
+    def full(self):
+        return len(self.items) >= self.size
+
+    def offer(self, item):
+        self.seen += 1
+        if len(self.items) < self.size:
+            self.items.append(item)
+            if len(self.items) == self.size:
+                self._w = math.exp(math.log(_open_uniform(self._rng)) / self.size)
+                self._schedule()
+        elif self.seen == self._next:
+            self.items[self._rng.randrange(self.size)] = item
+            self._w *= math.exp(math.log(_open_uniform(self._rng)) / self.size)
+            self._schedule()
+
+    def _schedule(self):
+        self._next = self.seen + math.floor(math.log(_open_uniform(self._rng)) / math.log1p(-self._w)) + 1
+
+
+class StratifiedSample:
+    """One Reservoir of `per_stratum` items per stratum key."""
+
+    def __init__(self, per_stratum, rng=None):
+        self.per_stratum = per_stratum
+        self.strata = {}
+        self._rng = rng or random.Random()
+
+    def offer(self, key, item):
+        """Add `item` to its stratum; True when `key` is a stratum not seen before."""
+        reservoir = self.strata.get(key)
+        is_new = reservoir is None
+        if is_new:
+            reservoir = self.strata[key] = Reservoir(self.per_stratum, self._rng)
+        reservoir.offer(item)
+        return is_new
+
+    def full(self):
+        return all(reservoir.full() for reservoir in self.strata.values())
+
+    @property
+    def items(self):
+        return [item for key in sorted(self.strata, key=str) for item in self.strata[key].items]
+
+
+def _cell(value):
+    return None if value is None or value == "" else value
+
+
+@contextlib.contextmanager
+def open_rows(path):
+    """`(columns, rows)` for an .xlsx (first sheet) or a CSV; rows are tuples, blanks are None."""
+    if path.lower().endswith(".xlsx"):
+        import openpyxl
+
+        workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = next(rows, ())
+            yield [str(name) if name is not None else "" for name in header], \
+                (tuple(_cell(v) for v in row) for row in rows)
+        finally:
+            workbook.close()
+    else:
+        with open_artifact(path, 'rt') as f:
+            rows = csv.reader(f)
+            yield next(rows, []), (tuple(_cell(v) for v in row) for row in rows)
+
+
+def sample_rows(path, size=PREVIEW_ROWS, per_stratum=None, strata=STRATA_COLUMNS, scan_rows=SCAN_ROWS,
+                patience=STRATA_PATIENCE, exclude=None, seed=None):
+    """Stream `path` and return `(columns, sampled rows, stats)`.
+
+    With `per_stratum` the sample is stratified by the `strata` columns,
+    otherwise it is a uniform sample of `size` rows. `exclude` maps a column
+    to values (compared stripped and upper-cased) whose rows are skipped.
+    """
+    rng = random.Random(seed)
+    stats = {"rows_read": 0, "rows_excluded": 0, "stopped": "end of file", "head_only": False}
+    with open_rows(path) as (columns, rows):
+        positions = {name: i for i, name in enumerate(columns)}
+        excluded = [(positions[name], {str(v).upper() for v in values})
+                    for name, values in (exclude or {}).items() if name in positions]
+        strata_positions = [positions[name] for name in strata if name in positions]
+        if per_stratum:
+            sampler = StratifiedSample(per_stratum, rng)
+        else:
+            sampler = Reservoir(size, rng)
+        last_new_stratum = 0
+
+        for row in rows:
+            stats["rows_read"] += 1
+            read = stats["rows_read"]
+            if read % PROGRESS_EVERY == 0:
+                print(f"ℹ️ {read} rows scanned")
+            if any(i < len(row) and str(row[i]).strip().upper() in values for i, values in excluded):
+                stats["rows_excluded"] += 1
+            elif per_stratum:
+                key = tuple(row[i] if i < len(row) else None for i in strata_positions)
+                if sampler.offer(key, row):
+                    last_new_stratum = read
+                elif read - last_new_stratum >= patience and sampler.full():
+                    stats["stopped"] = f"every stratum full, no new stratum in {patience} rows"
+                    break
+            else:
+                sampler.offer(row)
+            if scan_rows and read >= scan_rows:
+                stats["stopped"] = f"scan limit of {scan_rows} rows"
+                stats["head_only"] = next(rows, None) is not None
+                break
+
+    if per_stratum:
+        stats["strata"] = {" / ".join(str(v) for v in key): {"seen": r.seen, "sampled": len(r.items)}
+                           for key, r in sorted(sampler.strata.items(), key=lambda item: str(item[0]))}
+    stats["rows_sampled"] = len(sampler.items)
+    return columns, sampler.items, stats
+
+
+def format_sample_stats(path, stats):
+    lines = [f"🔎 Sampled {stats['rows_sampled']} of {stats['rows_read']} rows read from "
+             f"{os.path.basename(path)} (stopped: {stats['stopped']})"]
+    if stats["head_only"]:
+        lines.append(f"⚠️ Only the first {stats['rows_read']} rows were read: this samples the head of the file, "
+                     "not all of it")
+    if stats["rows_excluded"]:
+        lines.append(f"- {stats['rows_excluded']} excluded rows skipped")
+    for name, counts in stats.get("strata", {}).items():
+        lines.append(f"- {name}: {counts['sampled']} of {counts['seen']}")
+    return "\n".join(lines)
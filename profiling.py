@@ -0,0 +1,164 @@
+import cProfile
+import os
+import pstats
+import threading
+import tracemalloc
+
+# Sampled per-stage profiling for pipeline runs.
+#
+# A fraction of calls to each wrapped stage runs under cProfile and between two
+# tracemalloc snapshots. At the end of the run every stage gets a .pstats file,
+# a collapsed-stack file for flamegraph tools and a list of its top allocation
+# sites. tracemalloc is only on while a sampled call runs (it slows every
+# allocation in every thread several times), so unsampled calls run at full
+# speed and snapshots only hold what was allocated since tracing started.
+# Tracing is process-wide, though: allocations made by other stages running
+# concurrently with a sampled call still leak into that sample.
+
+DEFAULT_SAMPLE_RATE = 0.1
+TOP_ALLOCATIONS = 25
+TRACEMALLOC_FRAMES = 1
+
+
+def _frame_label(func):
+    filename, lineno, name = func
+    if filename == "~":
+        return name.replace(" ", "_")
+    return f"{name}@{os.path.basename(filename)}:{lineno}"
+
+
+def collapsed_stacks(stats, root_label):
+    """Approximate collapsed stacks from a pstats call graph.
+
+    cProfile keeps only caller->callee edges, so each function is attributed
+    to the path built by repeatedly following its heaviest caller.
+    """
+    entries = stats.stats
+    lines = []
+    for func, (_, _, tottime, _, _) in entries.items():
+        weight = int(tottime * 1_000_000)
+        if weight <= 0:
+            continue
+        path = [func]
+        seen = {func}
+        current = func
+        while True:
+            callers = entries.get(current, (0, 0, 0, 0, {}))[4]
+            candidates = [c for c in callers if c not in seen]
+            if not candidates:
+                break
+            current = max(candidates, key=lambda c: callers[c][3])
+            seen.add(current)
+            path.append(current)
+        frames = [root_label] + [_frame_label(f) for f in reversed(path)]
+        lines.append(f"{';'.join(frames)} {weight}")
+    return lines
+
+
+class StageProfiler:
+    def __init__(self, output_dir, sample_rate=DEFAULT_SAMPLE_RATE, top_allocations=TOP_ALLOCATIONS):
+        self.output_dir = output_dir
+        self.sample_rate = sample_rate
+        self.top_allocations = top_allocations
+        self._calls = {}
+        self._stats = {}
+        self._allocations = {}
+        self._sampled = {}
+        self._lock = threading.Lock()
+        self._tracing = 0  # sampled calls currently running with tracemalloc on
+        self._started_tracing = False
+        os.makedirs(output_dir, exist_ok=True)
+
+    def _should_sample(self, stage):
+        # Deterministic sampling: call n is profiled whenever n * rate crosses an integer
+        with self._lock:
+            n = self._calls.get(stage, 0)
+            self._calls[stage] = n + 1
+        return int((n + 1) * self.sample_rate) > int(n * self.sample_rate)
+
+    def _start_tracing(self):
+        with self._lock:
+            if self._tracing == 0 and not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                self._started_tracing = True
+            self._tracing += 1
+
+    def _stop_tracing(self):
+        # The last sampled call to finish turns tracing off, unless someone else turned it on
+        with self._lock:
+            self._tracing -= 1
+            if self._tracing == 0 and self._started_tracing:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def profile_call(self, stage, fn, *args, **kwargs):
+        profiler = cProfile.Profile()
+        self._start_tracing()
+        before = tracemalloc.take_snapshot()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another thread holds the interpreter's profiler slot; run this call unsampled
+            self._stop_tracing()
+            return fn(*args, **kwargs)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            after = tracemalloc.take_snapshot()
+            self._stop_tracing()
+            self._record(stage, profiler, after.compare_to(before, 'lineno'))
+
+    def _record(self, stage, profiler, allocation_diff):
+        stats = pstats.Stats(profiler)
+        with self._lock:
+            self._sampled[stage] = self._sampled.get(stage, 0) + 1
+            if stage in self._stats:
+                self._stats[stage].add(stats)
+            else:
+                self._stats[stage] = stats
+            sites = self._allocations.setdefault(stage, {})
+            for stat in allocation_diff:
+                if stat.size_diff <= 0:
+                    continue
+                frame = stat.traceback[0]
+                if frame.filename == __file__ or frame.filename == tracemalloc.__file__:
+                    continue
+                key = f"{frame.filename}:{frame.lineno}"
+                size, count = sites.get(key, (0, 0))
+                sites[key] = (size + stat.size_diff, count + max(stat.count_diff, 0))
+
+    def wrap(self, stage, fn, always=False):
+        """Return `fn` wrapped so that sampled calls are profiled under `stage`."""
+        def wrapped(*args, **kwargs):
+            if always or self._should_sample(stage):
+                return self.profile_call(stage, fn, *args, **kwargs)
+            return fn(*args, **kwargs)
+        return wrapped
+
+    def write_reports(self):
+        all_stacks = []
+        for stage, stats in self._stats.items():
+            stats.dump_stats(os.path.join(self.output_dir, f"{stage}.pstats"))
+
+            stacks = collapsed_stacks(stats, stage)
+            all_stacks.extend(stacks)
+            with open(os.path.join(self.output_dir, f"{stage}.collapsed.txt"), 'w', encoding='utf-8') as f:
+                f.write("\n".join(stacks) + "\n")
+
+            sites = sorted(self._allocations.get(stage, {}).items(), key=lambda item: item[1][0], reverse=True)
+            with open(os.path.join(self.output_dir, f"{stage}_allocations.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"# {stage}: top allocation sites over {self._sampled[stage]} sampled calls\n")
+                for site, (size, count) in sites[:self.top_allocations]:
+                    f.write(f"{size / 1024:10.1f} KiB {count:8d} blocks  {site}\n")
+
+        with open(os.path.join(self.output_dir, "all_stages.collapsed.txt"), 'w', encoding='utf-8') as f:
+            f.write("\n".join(all_stacks) + "\n")
+
+    def format_summary(self):
+        lines = [f"🔬 Profiles written to: {self.output_dir}"]
+        for stage, stats in self._stats.items():
+            total_calls = self._calls.get(stage, self._sampled[stage])
+            lines.append(f"- {stage}: {self._sampled[stage]}/{total_calls} calls sampled, "
+                         f"{stats.total_tt:.2f}s profiled")
+        return "\n".join(lines)
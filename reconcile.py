@@ -0,0 +1,185 @@
+import hashlib
+import json
+import os
+import tempfile
+import zlib
+
+from mongo_export import to_extended_json
+
+# Streaming reconciliation of source bars against what landed in the target.
+#
+# Both sides are reduced to (key, content hash) pairs and written to
+# hash-partitioned spill files, so no side is ever held in memory as a whole.
+# Each partition is then compared on its own: the source half is loaded into
+# a dict and the target half is streamed against it. Memory is bounded by the
+# largest partition (roughly rows / partitions keys), not by the dataset.
+# Fields the target adds on insert (_id, timestamps) are left out of the hash.
+#
+# Keys need not be unique (chains share a slug): the documents of a key are
+# compared as a multiset of content hashes, so each source document must land
+# exactly as often as it occurs in the source. Leftovers of a key pair up as
+# mismatched, the rest are missing or extra. Source documents that are exact
+# copies and keys shared by different documents are reported, but only the
+# FAILURES fail the check.
+
+PARTITIONS = 16
+DEFAULT_IGNORED_FIELDS = ("_id", "__v", "createdAt", "updatedAt", "_failure_reason")
+REPORT_SHOWN = 10
+
+MISSING = "missing"
+EXTRA = "extra"
+MISMATCHED = "mismatched"
+DUPLICATE_TARGET = "duplicate_target"  # a source document landed more often than it occurs in the source
+DUPLICATE_SOURCE = "duplicate_source"  # identical documents in the source
+SHARED_KEY = "shared_key"  # a key carried by several different source documents
+FAILURES = (MISSING, EXTRA, MISMATCHED, DUPLICATE_TARGET)
+STATUSES = FAILURES + (DUPLICATE_SOURCE, SHARED_KEY)
+
+
+def content_hash(doc, ignored_fields=DEFAULT_IGNORED_FIELDS):
+    """Stable digest of a document: canonical JSON (sorted keys) without the ignored fields."""
+    canonical = {k: v for k, v in doc.items() if k not in ignored_fields}
+    text = json.dumps(to_extended_json(canonical), sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+
+class PartitionedHashes:
+    """(key, hash) pairs spilled to `partitions` files chosen by a hash of the key."""
+
+    def __init__(self, work_dir, side, partitions=PARTITIONS):
+        self.paths = [os.path.join(work_dir, f"{side}-{i:04d}.tsv") for i in range(partitions)]
+        self._files = [open(path, 'w', encoding='utf-8') for path in self.paths]
+        self.count = 0
+        self.keyless = 0
+
+    def add(self, key, digest):
+        if key is None or key == "":
+            self.keyless += 1
+            return
+        encoded = json.dumps(key, ensure_ascii=False)
+        partition = zlib.crc32(encoded.encode("utf-8")) % len(self._files)
+        self._files[partition].write(f"{encoded}\t{digest}\n")
+        self.count += 1
+
+    def close(self):
+        for f in self._files:
+            f.close()
+
+    def read(self, partition):
+        with open(self.paths[partition], 'r', encoding='utf-8') as f:
+            for line in f:
+                key, digest = line.rstrip("\n").split("\t")
+                yield json.loads(key), digest
+
+
+def _spill(docs, work_dir, side, key, partitions, ignored_fields):
+    hashes = PartitionedHashes(work_dir, side, partitions)
+    try:
+        for doc in docs:
+            hashes.add(doc.get(key), content_hash(doc, ignored_fields))
+    finally:
+        hashes.close()
+    return hashes
+
+
+def _compare_partition(source, target, partition, write):
+    counts = dict.fromkeys(STATUSES, 0)
+    expected = {}  # key -> {hash: source documents not yet matched}
+    for key, digest in source.read(partition):
+        hashes = expected.setdefault(key, {})
+        seen = hashes.get(digest, 0)
+        hashes[digest] = seen + 1
+        if seen == 1:
+            counts[DUPLICATE_SOURCE] += 1
+            write(key, DUPLICATE_SOURCE, source_hash=digest)
+        elif seen == 0 and len(hashes) == 2:
+            counts[SHARED_KEY] += 1
+            write(key, SHARED_KEY)
+
+    matched = 0
+    unmatched = {}  # key -> target hashes no source document of the key has
+    for key, digest in target.read(partition):
+        hashes = expected.get(key)
+        if hashes is None:
+            counts[EXTRA] += 1
+            write(key, EXTRA, target_hash=digest)
+        elif hashes.get(digest):
+            hashes[digest] -= 1
+            matched += 1
+        elif digest in hashes:
+            counts[DUPLICATE_TARGET] += 1
+            write(key, DUPLICATE_TARGET, target_hash=digest)
+        else:
+            unmatched.setdefault(key, []).append(digest)
+
+    for key, hashes in expected.items():
+        missing = [digest for digest, left in hashes.items() for _ in range(left)]
+        extra = unmatched.pop(key, [])
+        for source_hash, target_hash in zip(missing, extra):
+            counts[MISMATCHED] += 1
+            write(key, MISMATCHED, source_hash=source_hash, target_hash=target_hash)
+        for source_hash in missing[len(extra):]:
+            counts[MISSING] += 1
+            write(key, MISSING, source_hash=source_hash)
+        for target_hash in extra[len(missing):]:
+            counts[EXTRA] += 1
+            write(key, EXTRA, target_hash=target_hash)
+    return counts, matched
+
+
+def reconcile(source_docs, target_docs, report_path, key="slug", partitions=PARTITIONS,
+              ignored_fields=DEFAULT_IGNORED_FIELDS, work_dir=None):
+    """Compare two document streams by `key` and content hash.
+
+    Every discrepancy is written as one NDJSON line to `<report>.ndjson`; the
+    returned summary (also saved to `report_path`) holds the counts and the
+    first few keys of each kind. `ok` only looks at the FAILURES.
+    """
+    summary = {"key": key, "partitions": partitions, "ignored_fields": list(ignored_fields)}
+    summary.update(dict.fromkeys(STATUSES, 0))
+    examples = {status: [] for status in STATUSES}
+    details_path = os.path.splitext(report_path)[0] + ".ndjson"
+
+    with tempfile.TemporaryDirectory(prefix="reconcile-", dir=work_dir) as tmp_dir, \
+            open(details_path, 'w', encoding='utf-8') as details:
+        def write(doc_key, status, **extra):
+            details.write(json.dumps({"key": doc_key, "status": status, **extra}, ensure_ascii=False) + "\n")
+            if len(examples[status]) < REPORT_SHOWN:
+                examples[status].append(doc_key)
+
+        source = _spill(source_docs, tmp_dir, "source", key, partitions, ignored_fields)
+        target = _spill(target_docs, tmp_dir, "target", key, partitions, ignored_fields)
+        summary["source_documents"] = source.count
+        summary["target_documents"] = target.count
+        summary["source_without_key"] = source.keyless
+        summary["target_without_key"] = target.keyless
+        summary["matched"] = 0
+        for partition in range(partitions):
+            counts, matched = _compare_partition(source, target, partition, write)
+            for status, count in counts.items():
+                summary[status] += count
+            summary["matched"] += matched
+
+    summary["examples"] = examples
+    summary["details"] = details_path
+    summary["ok"] = not any(summary[status] for status in FAILURES)
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2, ensure_ascii=False)
+    return summary
+
+
+def format_summary(summary):
+    lines = [
+        f"🧮 Reconciliation by {summary['key']}: {summary['source_documents']} source, "
+        f"{summary['target_documents']} target, {summary['matched']} matched",
+    ]
+    for status in STATUSES:
+        if summary[status]:
+            shown = ", ".join(str(k) for k in summary["examples"][status])
+            note = "" if status in FAILURES else " (not a failure)"
+            lines.append(f"- {status}: {summary[status]}{note} (e.g. {shown})")
+    for side in ("source", "target"):
+        if summary[f"{side}_without_key"]:
+            lines.append(f"- {side} documents without {summary['key']}: {summary[f'{side}_without_key']}")
+    lines.append("✅ Target matches the source" if summary["ok"] else f"⚠️ Details: {summary['details']}")
+    return "\n".join(lines)
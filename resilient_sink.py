@@ -0,0 +1,196 @@
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from bar_sink import post_bar_with_reason, strip_internal_fields
+
+# Circuit breaker and disk spool around the posting sink.
+#
+# After `failure_threshold` consecutive connection errors or timeouts the
+# breaker opens: posting threads stop calling the API and spool bars to a
+# SQLite queue on disk instead of each waiting out the request timeout. A
+# background drainer probes the API with the oldest spooled bar every
+# `reset_seconds` (half-open); when the probe lands the breaker closes and the
+# spool is drained while new bars are posted directly again. Whatever is still
+# spooled at the end of a run survives on disk for the `drain` command.
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+FAILURE_THRESHOLD = 5
+RESET_SECONDS = 30
+DRAIN_BATCH = 50
+
+# Reasons that mean the API is unreachable rather than rejecting the bar
+TRANSIENT_REASONS = ("connection_error", "timeout")
+SPOOLED = "spooled"
+
+
+class CircuitBreaker:
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self.trips = 0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        """True when callers may use the API; only the prober may while open or half-open."""
+        return self.state == CLOSED
+
+    def try_probe(self):
+        """Move an open breaker to half-open once `reset_seconds` have passed; True if this caller probes."""
+        with self._lock:
+            if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_seconds:
+                self.state = HALF_OPEN
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != CLOSED:
+                print("✅ API is back; circuit breaker closed")
+            self.state = CLOSED
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+                if self.state == CLOSED:
+                    self.trips += 1
+                    print(f"⚠️ {self.failures} consecutive connection failures; circuit breaker open, "
+                          f"spooling bars to disk")
+                self.state = OPEN
+                self.opened_at = time.monotonic()
+
+
+class BarSpool:
+    """Durable FIFO of bars waiting for the API, backed by SQLite."""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS spool (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+                           "bar TEXT NOT NULL, reason TEXT)")
+        self._conn.commit()
+
+    def put(self, bar_object, reason=None):
+        body = json.dumps(strip_internal_fields(bar_object), ensure_ascii=False)
+        with self._lock:
+            self._conn.execute("INSERT INTO spool (bar, reason) VALUES (?, ?)", (body, reason))
+            self._conn.commit()
+
+    def peek(self, limit=DRAIN_BATCH):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, bar FROM spool ORDER BY id LIMIT ?", (limit,)).fetchall()
+        return [(row_id, json.loads(body)) for row_id, body in rows]
+
+    def remove(self, row_ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM spool WHERE id = ?", [(row_id,) for row_id in row_ids])
+            self._conn.commit()
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM spool").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class ResilientSink:
+    """`post_bar_with_reason` behind a circuit breaker, spooling to disk while the API is down.
+
+    Bars drained from the spool come back through `take_drained()` as
+    `(bar, ok, reason)` so the caller can record them with its other results.
+    """
+
+    def __init__(self, api_url, spool_path, failure_threshold=FAILURE_THRESHOLD, reset_seconds=RESET_SECONDS):
+        self.api_url = api_url
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.spool = BarSpool(spool_path)
+        self.spooled = 0
+        self.drained = 0
+        self._results = queue.SimpleQueue()
+        self._stop = threading.Event()
+        self._drainer = threading.Thread(target=self._drain_loop, name="spool-drainer", daemon=True)
+        self._drainer.start()
+
+    def post(self, bar_object, body=None):
+        """Post or spool one bar; returns `(ok, reason)` with reason "spooled" when it went to disk."""
+        if not self.breaker.allow_request():
+            return self._spool(bar_object, SPOOLED)
+        ok, reason = post_bar_with_reason(bar_object, self.api_url, body)
+        if ok:
+            self.breaker.record_success()
+            return True, None
+        if reason in TRANSIENT_REASONS:
+            self.breaker.record_failure()
+            return self._spool(bar_object, reason)
+        return False, reason
+
+    def _spool(self, bar_object, reason):
+        self.spool.put(bar_object, reason)
+        self.spooled += 1
+        return False, SPOOLED
+
+    def drain_once(self, limit=DRAIN_BATCH):
+        """Post up to `limit` spooled bars; stops at the first transient failure. Returns the number sent."""
+        batch = self.spool.peek(limit)
+        done = []
+        try:
+            for row_id, bar_object in batch:
+                ok, reason = post_bar_with_reason(bar_object, self.api_url)
+                if not ok and reason in TRANSIENT_REASONS:
+                    self.breaker.record_failure()
+                    break
+                self.breaker.record_success()
+                done.append(row_id)
+                self._results.put((bar_object, ok, reason))
+        finally:
+            self.spool.remove(done)
+            self.drained += len(done)
+        return len(done)
+
+    def _drain_loop(self):
+        interval = min(1.0, self.breaker.reset_seconds)
+        while not self._stop.wait(interval):
+            if self.breaker.state == OPEN:
+                if not self.breaker.try_probe():
+                    continue
+                # Half-open: the oldest spooled bar is the probe
+                if not self.drain_once(limit=1):
+                    continue
+            if self.breaker.allow_request():
+                while not self._stop.is_set() and self.breaker.allow_request() and self.drain_once():
+                    pass
+
+    def take_drained(self):
+        results = []
+        while True:
+            try:
+                results.append(self._results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def close(self, final_drain=True):
+        """Stop the drainer, try one last drain if the API is up, and return how many bars stay spooled."""
+        self._stop.set()
+        self._drainer.join()
+        if final_drain:
+            while self.breaker.allow_request() and self.drain_once():
+                pass
+        remaining = len(self.spool)
+        self.spool.close()
+        return remaining
@@ -0,0 +1,163 @@
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+
+from compression import open_artifact
+from hours_parser import hours_are_valid
+
+# Data-quality rules applied to whole chunk columns at once. Every row gets a
+# bitmask of failed rules; rows with any bit in REJECT_MASK are quarantined,
+# the rest are kept and only counted in the run summary.
+
+MISSING_NAME = 1 << 0
+MISSING_ADDRESS = 1 << 1
+MISSING_COORDINATES = 1 << 2
+INVALID_COORDINATES = 1 << 3
+INVALID_EMAIL = 1 << 4
+INVALID_URL = 1 << 5
+INVALID_PHONE = 1 << 6
+INVALID_HOURS = 1 << 7
+
+REASON_NAMES = {
+    MISSING_NAME: "missing_name",
+    MISSING_ADDRESS: "missing_address",
+    MISSING_COORDINATES: "missing_coordinates",
+    INVALID_COORDINATES: "invalid_coordinates",
+    INVALID_EMAIL: "invalid_email",
+    INVALID_URL: "invalid_url",
+    INVALID_PHONE: "invalid_phone",
+    INVALID_HOURS: "invalid_hours",
+}
+
+# transform_row cannot build a bar without a name; everything else is a warning
+REJECT_MASK = MISSING_NAME
+
+EMAIL_PATTERN = r"[^@\s,;]+@[^@\s,;]+\.[A-Za-z]{2,}"
+URL_PATTERN = r"(?:https?://)?(?:[A-Za-z0-9-]+\.)+[A-Za-z]{2,}(?::\d+)?(?:[/?#]\S*)?"
+PHONE_DIGITS = (10, 15)
+
+
+def _column(chunk, name):
+    if name in chunk.columns:
+        return chunk[name]
+    return pd.Series(None, index=chunk.index, dtype=object)
+
+
+def _text(series):
+    """Stripped string view of a column with blanks turned into NA."""
+    text = series.astype("string").str.strip()
+    return text.mask(text == "")
+
+
+def _flag(masks, condition, bit):
+    masks |= np.where(condition.fillna(False).to_numpy(dtype=bool), bit, 0).astype(masks.dtype)
+
+
+def validate_chunk(chunk):
+    """Return a uint16 reason bitmask for every row of `chunk`."""
+    masks = np.zeros(len(chunk), dtype=np.uint16)
+
+    _flag(masks, _text(_column(chunk, "Name")).isna(), MISSING_NAME)
+    _flag(masks, _text(_column(chunk, "Full Address")).isna(), MISSING_ADDRESS)
+
+    lon_raw = _column(chunk, "Establishment Longitude")
+    lat_raw = _column(chunk, "Establishment Latitude")
+    lon = pd.to_numeric(lon_raw, errors="coerce")
+    lat = pd.to_numeric(lat_raw, errors="coerce")
+    missing = lon_raw.isna() | lat_raw.isna()
+    _flag(masks, missing, MISSING_COORDINATES)
+    _flag(masks, ~missing & (~lon.between(-180, 180) | ~lat.between(-90, 90)), INVALID_COORDINATES)
+
+    # Same precedence as transform_row: most common email, then the first direct email
+    email = _text(_column(chunk, "Most Common Email"))
+    email = email.fillna(_text(_column(chunk, "Direct Emails")))
+    email = email.str.split(",").str[0].astype("string").str.strip()
+    _flag(masks, email.notna() & ~email.str.fullmatch(EMAIL_PATTERN), INVALID_EMAIL)
+
+    url = _text(_column(chunk, "URL"))
+    _flag(masks, url.notna() & ~url.str.fullmatch(URL_PATTERN), INVALID_URL)
+
+    phone = _text(_column(chunk, "Phone"))
+    digits = phone.str.replace(r"\D", "", regex=True).str.len()
+    _flag(masks, phone.notna() & ~digits.between(*PHONE_DIGITS), INVALID_PHONE)
+
+    hours = _text(_column(chunk, "Opening Hours"))
+    # Checked with the parser itself, so every grammar it reads passes; repeated strings are a cache hit
+    _flag(masks, hours.notna() & ~hours.map(hours_are_valid, na_action="ignore").astype("boolean"), INVALID_HOURS)
+
+    return masks
+
+
+def describe_reasons(mask):
+    return [name for bit, name in REASON_NAMES.items() if mask & bit]
+
+
+def split_valid(chunk, masks, reject_mask=REJECT_MASK):
+    """Split `chunk` into (accepted, rejected, rejected_masks)."""
+    rejected = (masks & reject_mask) != 0
+    return chunk[~rejected], chunk[rejected], masks[rejected]
+
+
+class ValidationSummary:
+    def __init__(self, reject_mask=REJECT_MASK):
+        self.reject_mask = reject_mask
+        self.rows_checked = 0
+        self.rows_rejected = 0
+        self.reason_counts = {name: 0 for name in REASON_NAMES.values()}
+        self._lock = threading.Lock()
+
+    def add(self, masks):
+        counts = {name: int(np.count_nonzero(masks & bit)) for bit, name in REASON_NAMES.items()}
+        with self._lock:
+            self.rows_checked += len(masks)
+            self.rows_rejected += int(np.count_nonzero(masks & self.reject_mask))
+            for name, count in counts.items():
+                self.reason_counts[name] += count
+
+    def to_dict(self):
+        return {
+            "rows_checked": self.rows_checked,
+            "rows_rejected": self.rows_rejected,
+            "reasons": dict(self.reason_counts),
+        }
+
+    def format(self):
+        lines = [f"🔎 Validation: {self.rows_checked} rows checked, {self.rows_rejected} quarantined"]
+        for bit, name in REASON_NAMES.items():
+            count = self.reason_counts[name]
+            if count:
+                action = "rejected" if bit & self.reject_mask else "warning"
+                lines.append(f"- {name}: {count} ({action})")
+        return "\n".join(lines)
+
+
+class QuarantineWriter:
+    """Append rejected rows as NDJSON with their reasons; safe to share between threads."""
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._file = None
+        self._lock = threading.Lock()
+
+    def write(self, rejected, masks):
+        if rejected.empty:
+            return
+        records = rejected.astype(object).where(rejected.notna(), None).to_dict('records')
+        lines = []
+        for record, mask in zip(records, masks):
+            record["_reason_mask"] = int(mask)
+            record["_reasons"] = describe_reasons(mask)
+            lines.append(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+        with self._lock:
+            if self._file is None:
+                self._file = open_artifact(self.path, 'wt')
+            self._file.write("".join(lines))
+            self.rows += len(lines)
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None